@@ -1,22 +1,138 @@
 import pandas as pd
 import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 import time
 import random
 import re
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import logging
 from urllib.parse import urlparse, urljoin
 import json
-from datetime import datetime
-import PyPDF2
-import io
+import os
+from datetime import datetime, timedelta
+import pypdfium2 as pdfium
+import socket
+import functools
+import threading
+import concurrent.futures
+import asyncio
+import aiohttp
+import ahocorasick
+from collections import defaultdict
+
+# Precompiled patterns shared by the validators, scrapers and PDF scan
+_RX_LTD = re.compile(r'\b(LIMITED|LTD|CO\.?,?\s*LTD\.?)\b', re.IGNORECASE)
+_RX_NONWORD = re.compile(r'[^\w\s]')
+_RX_WS = re.compile(r'\s+')
+_RX_URL = re.compile(r'https?://(?:www\.)?([a-zA-Z0-9-]+\.(?:co\.uk|com|org))')
+_RX_UDDG = re.compile(r'uddg=([^&]+)')
+_RX_YEAR = re.compile(r'20(22|23|24)')
+_RX_PDF_LINK = re.compile(r'View PDF|Download')
+_RX_REGISTERED_OFFICE = re.compile(r'Registered office address')
+
+# Employee-count phrasings seen in UK accounts filings; each captures the number
+_EMPLOYEE_PATTERNS = (
+    r'average\s+number\s+of\s+employees[:\s]+(\d+)',
+    r'number\s+of\s+employees[:\s]+(\d+)',
+    r'employees?\s*[:\-]\s*(\d+)',
+    r'staff\s+numbers?[:\s]+(\d+)',
+    r'total\s+employees[:\s]+(\d+)',
+    r'workforce[:\s]+(\d+)',
+    r'employ(?:ed|s)?\s+(\d+)\s+(?:people|staff|employees)',
+    r'(\d+)\s+employees?\s+(?:were\s+)?employed',
+    r'employment\s+of\s+(\d+)',
+    r'(\d+)\s+(?:full|part).{0,20}time\s+employees?'
+)
+# One alternation so the text is walked once instead of once per phrasing
+_RX_EMPLOYEES = re.compile('|'.join(f'(?:{p})' for p in _EMPLOYEE_PATTERNS), re.IGNORECASE)
+
+# Domains that are never a company's own site; matched anywhere in the host
+_BLACKLISTED_DOMAINS = (
+    'microsoft.com', 'google.com', 'facebook.com', 'linkedin.com', 'twitter.com',
+    'youtube.com', 'wikipedia.org', 'gov.uk', 'bbc.com', 'booking.com',
+    'cnbc.com', 'scribd.com', 'forums.', 'forum.', 'support.', 'answers.',
+    'fandom.com', 'npmjs.com', 'kortoverkobenhavn.com', 'svenskafans.com',
+    'writedu.com', 'bmj.com', 'epictravelplans.com', 'fuji-x-forum.com',
+    'leagueoflegends.', 'wordreference.com', 'x-plane.org'
+)
+_RX_BLACKLIST = re.compile('|'.join(map(re.escape, _BLACKLISTED_DOMAINS)))
+
+_BUSINESS_KEYWORDS = frozenset({'company', 'business', 'services', 'products', 'about us', 'contact', 'manufacturing'})
+
+# Pages bigger than this are not worth flattening to text just to verify them
+_MAX_VERIFY_BYTES = 2 * 1024 * 1024
+
+# Meta tags and about sections live near the top; never read more than this
+_MAX_HTML_BYTES = 256 * 1024
+
+# The meta description is in <head>; when the closing tag is missing, look this far in
+_RX_HEAD_END = re.compile(rb'</head\s*>', re.IGNORECASE)
+_MAX_HEAD_BYTES = 64 * 1024
+
+# pdfium needs a whole PDF (the xref table is at the end), so a prefix is no use; files are
+# read whole up to the cap, and anything bigger is skipped with a log line
+_MAX_PDF_BYTES = 16 * 1024 * 1024
+
+def _build_automaton(words) -> ahocorasick.Automaton:
+    """Build an Aho-Corasick automaton that reports each word it finds"""
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+@functools.lru_cache(maxsize=1024)
+def _verification_automaton(company_words: frozenset) -> ahocorasick.Automaton:
+    """Business keywords plus one company's name words, built once per company"""
+    return _build_automaton(_BUSINESS_KEYWORDS | company_words)
+
+@functools.lru_cache(maxsize=4096)
+def _normalize_company(company_name: str) -> Tuple[str, ...]:
+    """Lower-cased company name words longer than two characters, legal suffix and punctuation removed"""
+    clean_name = _RX_NONWORD.sub('', _RX_LTD.sub('', company_name)).strip().lower()
+    return tuple(word for word in clean_name.split() if len(word) > 2)
+
+def _row_value(row, column: str) -> str:
+    """Stripped cell value from a Series/dict row or an itertuples row, '' when missing or NaN"""
+    if hasattr(row, 'get'):
+        value = row.get(column, '')
+    else:
+        value = getattr(row, column.replace('.', '_'), '')
+    value = str(value).strip()
+    return '' if value == 'nan' else value
+
+# Companies House REST and document API hosts; only these ever see the API key
+_CH_API_HOSTS = frozenset({
+    'api.company-information.service.gov.uk',
+    'document-api.company-information.service.gov.uk',
+    'frontend-doc-api.company-information.service.gov.uk'
+})
+_CH_ADDRESS_FIELDS = ('care_of', 'po_box', 'premises', 'address_line_1', 'address_line_2',
+                      'locality', 'region', 'postal_code', 'country')
+
+def _is_cacheable(response: requests.Response) -> bool:
+    """Cache everything except search result pages, which go stale quickly"""
+    return 'duckduckgo.com' not in urlparse(response.url).netloc
+
+@functools.lru_cache(maxsize=4096)
+def _resolves(host: str) -> bool:
+    """Whether host has a DNS record; most guessed SME domains don't, and this costs no TCP/TLS"""
+    try:
+        socket.getaddrinfo(host, 443, type=socket.SOCK_STREAM)
+        return True
+    except socket.gaierror:
+        return False
 
 class QualityValidator:
     """AI-powered quality validation for enrichment results"""
     
     @staticmethod
-    def validate_company_website(url: str, company_name: str, sic_codes: List[str]) -> Dict:
+    def validate_company_website(url: str, company_name: str, sic_codes: List[str],
+                                 company_tokens: Optional[Tuple[str, ...]] = None) -> Dict:
         """Validate if a URL is actually the company's official website"""
         if not url or not url.startswith('http'):
             return {"valid": False, "reason": "Invalid URL format"}
@@ -26,22 +142,11 @@ class QualityValidator:
             domain = parsed.netloc.lower()
             
             # Immediate disqualification criteria
-            blacklisted_domains = [
-                'microsoft.com', 'google.com', 'facebook.com', 'linkedin.com', 'twitter.com',
-                'youtube.com', 'wikipedia.org', 'gov.uk', 'bbc.com', 'booking.com',
-                'cnbc.com', 'scribd.com', 'forums.', 'forum.', 'support.', 'answers.',
-                'fandom.com', 'npmjs.com', 'kortoverkobenhavn.com', 'svenskafans.com',
-                'writedu.com', 'bmj.com', 'epictravelplans.com', 'fuji-x-forum.com',
-                'leagueoflegends.', 'wordreference.com', 'x-plane.org'
-            ]
-            
-            if any(blocked in domain for blocked in blacklisted_domains):
+            if _RX_BLACKLIST.search(domain):
                 return {"valid": False, "reason": f"Blacklisted domain: {domain}"}
                 
             # Check domain relevance to company name
-            company_words = re.sub(r'\b(LIMITED|LTD|CO\.?,?\s*LTD\.?)\b', '', company_name, flags=re.IGNORECASE)
-            company_words = re.sub(r'[^\w\s]', ' ', company_words).strip().lower().split()
-            company_words = [word for word in company_words if len(word) > 2]
+            company_words = company_tokens if company_tokens is not None else _normalize_company(company_name)
             
             domain_matches = sum(1 for word in company_words if word in domain)
             
@@ -77,57 +182,141 @@ class QualityValidator:
         return {"valid": True, "confidence": 70}
 
 class CompanyEnrichmentAgent:
-    def __init__(self, delay_range=(3, 6)):
+    def __init__(self, delay_range=(3, 6), max_workers=8, per_host_limit=3, ch_api_key=None,
+                 cache_name='enrich_cache'):
         self.delay_range = delay_range
-        self.session = requests.Session()
+        self.max_workers = max_workers
+        # On-disk response cache so re-runs and retries skip the network
+        self.session = requests_cache.CachedSession(
+            cache_name,
+            expire_after=timedelta(days=7),
+            allowable_methods=('GET', 'HEAD'),
+            filter_fn=_is_cacheable
+        )
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Connection': 'keep-alive'
         })
         
+        # Reuse sockets across Companies House / search / website calls
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
         self.validator = QualityValidator()
         
-    def random_delay(self):
-        time.sleep(random.uniform(*self.delay_range))
+        # Companies House API (structured JSON); HTML scraping is the fallback without a key
+        self.ch_api_base = "https://api.company-information.service.gov.uk"
+        self.ch_api_key = ch_api_key or os.environ.get('CH_API_KEY', '')
+        
+        # Cap concurrent requests per host so worker threads stay polite
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(per_host_limit))
+        self._host_slots_lock = threading.Lock()
         
-    def find_official_website(self, company_name: str, company_number: str) -> str:
+        # Per-host pacing: each host has its own next-allowed time, so unrelated
+        # hosts (search, Companies House, company sites) never wait on each other
+        self._host_locks = defaultdict(threading.Lock)
+        self._host_next_ok = defaultdict(float)
+        
+    def _wait_for_host(self, host: str):
+        """Block until host may be contacted again, then book its next slot"""
+        with self._host_locks[host]:
+            wait = self._host_next_ok[host] - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._host_next_ok[host] = time.monotonic() + random.uniform(*self.delay_range)
+            
+    def _is_cached(self, method: str, url: str, **kwargs) -> bool:
+        """Whether the response cache already holds this request"""
+        request = self.session.prepare_request(
+            requests.Request(method, url, params=kwargs.get('params'), headers=kwargs.get('headers'))
+        )
+        return self.session.cache.contains(request=request)
+        
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Issue a request through the shared session, paced per host and holding a per-host slot"""
+        host = urlparse(url).netloc.lower()
+        if self.ch_api_key and host in _CH_API_HOSTS:
+            kwargs.setdefault('auth', (self.ch_api_key, ''))
+            
+        # Streamed reads are capped, but requests-cache would read the whole body to store
+        # it, so they bypass the cache entirely
+        if kwargs.get('stream'):
+            kwargs['expire_after'] = requests_cache.DO_NOT_CACHE
+            
+        # Cache hits never touch the host, so they skip the pacing
+        if kwargs.get('stream') or not self._is_cached(method, url, **kwargs):
+            self._wait_for_host(host)
+            
+        with self._host_slots_lock:
+            slot = self._host_slots[host]
+        with slot:
+            return self.session.request(method, url, **kwargs)
+        
+    def _fetch_html(self, url: str, timeout: int, max_content_length: Optional[int] = None) -> Optional[bytes]:
+        """Read at most _MAX_HTML_BYTES of an HTML page; None if it is missing, not HTML or too big"""
+        response = self._request('GET', url, timeout=timeout, stream=True)
+        try:
+            if response.status_code >= 400:
+                return None
+                
+            content_type = response.headers.get('Content-Type', '').lower()
+            if content_type and 'html' not in content_type:
+                return None
+                
+            if max_content_length and int(response.headers.get('Content-Length') or 0) > max_content_length:
+                return None
+                
+            return response.raw.read(_MAX_HTML_BYTES, decode_content=True)
+        finally:
+            response.close()
+            
+    def find_official_website(self, company_name: str, company_number: str,
+                              company_tokens: Optional[Tuple[str, ...]] = None) -> str:
         """Find the official company website using multiple high-quality methods"""
+        if company_tokens is None:
+            company_tokens = _normalize_company(company_name)
+            
+        # Cheapest first: domain construction, Companies House filings, then a web search.
+        # A confident hit ends the search; a weaker one is kept in case nothing better turns up
+        methods = (
+            ("domain construction", lambda: self._construct_and_test_domains(company_name, company_tokens)),
+            ("Companies House", lambda: self._extract_website_from_companies_house(company_number) if company_number else ""),
+            ("filtered search", lambda: self._search_with_quality_filter(company_name, company_tokens))
+        )
         
-        # Method 1: Direct domain construction and testing
-        website = self._construct_and_test_domains(company_name)
-        if website:
-            validation = self.validator.validate_company_website(website, company_name, [])
-            if validation["valid"]:
-                self.logger.info(f"Found website via domain construction: {website}")
+        fallback = ""
+        for source, method in methods:
+            website = method()
+            if not website:
+                continue
+                
+            validation = self.validator.validate_company_website(website, company_name, [], company_tokens)
+            if not validation["valid"]:
+                continue
+                
+            if validation.get("confidence", 0) >= 70:
+                self.logger.info(f"Found website via {source}: {website}")
                 return website
                 
-        # Method 2: Companies House filing search for website mentions
-        if company_number:
-            website = self._extract_website_from_companies_house(company_number)
-            if website:
-                validation = self.validator.validate_company_website(website, company_name, [])
-                if validation["valid"]:
-                    self.logger.info(f"Found website via Companies House: {website}")
-                    return website
-                    
-        # Method 3: Targeted web search with quality filtering
-        website = self._search_with_quality_filter(company_name)
-        if website:
-            self.logger.info(f"Found website via filtered search: {website}")
-            return website
+            fallback = fallback or website
             
-        return ""
+        if fallback:
+            self.logger.info(f"Found low-confidence website: {fallback}")
+        return fallback
         
-    def _construct_and_test_domains(self, company_name: str) -> str:
-        """Construct and test likely domain names"""
-        # Clean company name
-        clean_name = re.sub(r'\b(LIMITED|LTD|CO\.?,?\s*LTD\.?)\b', '', company_name, flags=re.IGNORECASE)
-        clean_name = re.sub(r'[^\w\s]', '', clean_name).strip().lower()
-        words = [w for w in clean_name.split() if len(w) > 2]
+    def _domain_candidates(self, company_tokens: Tuple[str, ...]) -> List[str]:
+        """Build likely domain names from a company's name words, most specific first"""
+        words = company_tokens
         
         if not words:
-            return ""
+            return []
             
         # Generate domain candidates
         candidates = []
@@ -143,46 +332,78 @@ class CompanyEnrichmentAgent:
             f"{words[0]}.com"
         ])
         
-        # Test each candidate
-        for domain in candidates[:4]:  # Limit to prevent abuse
-            try:
-                test_url = f"https://www.{domain}"
-                self.random_delay()
-                
-                response = self.session.head(test_url, timeout=8, allow_redirects=True)
-                if 200 <= response.status_code < 400:
-                    # Verify it's actually a business website
-                    if self._verify_business_website(test_url, company_name):
-                        return test_url
-                        
-            except Exception:
-                continue
-                
+        return candidates[:4]  # Limit to prevent abuse
+        
+    def _construct_and_test_domains(self, company_name: str, company_tokens: Tuple[str, ...]) -> str:
+        """Construct and test likely domain names"""
+        return asyncio.run(self._construct_and_test_domains_async(company_name, company_tokens))
+        
+    async def _construct_and_test_domains_async(self, company_name: str, company_tokens: Tuple[str, ...]) -> str:
+        """Probe all candidate domains at once, then verify hits in preference order"""
+        hosts = [f"www.{domain}" for domain in self._domain_candidates(company_tokens)]
+        
+        # Drop names that don't resolve before opening any connections
+        resolved = await asyncio.gather(*(asyncio.to_thread(_resolves, host) for host in hosts))
+        test_urls = [f"https://{host}" for host, ok in zip(hosts, resolved) if ok]
+        if not test_urls:
+            return ""
+            
+        # Each candidate is a different host contacted once, so no pacing is needed here
+        connector = aiohttp.TCPConnector(limit_per_host=4, ttl_dns_cache=300)
+        async with aiohttp.ClientSession(
+            connector=connector,
+            headers={'User-Agent': self.session.headers['User-Agent']},
+            timeout=aiohttp.ClientTimeout(total=8)
+        ) as session:
+            statuses = await asyncio.gather(*(self._head_status(session, url) for url in test_urls))
+            
+        for test_url, status in zip(test_urls, statuses):
+            if status and 200 <= status < 400:
+                # Verify it's actually a business website
+                if self._verify_business_website(test_url, company_name, company_tokens):
+                    return test_url
+                    
         return ""
         
-    def _verify_business_website(self, url: str, company_name: str) -> bool:
+    @staticmethod
+    async def _head_status(session: aiohttp.ClientSession, url: str) -> Optional[int]:
+        """HEAD a URL and return its final status code, or None if unreachable"""
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                return response.status
+        except Exception:
+            return None
+            
+    def _verify_business_website(self, url: str, company_name: str,
+                                 company_tokens: Optional[Tuple[str, ...]] = None) -> bool:
         """Verify URL is actually a business website"""
         try:
-            self.random_delay()
-            response = self.session.get(url, timeout=10)
-            if response.status_code >= 400:
+            # Huge pages are treated as non-business rather than flattened
+            html = self._fetch_html(url, timeout=10, max_content_length=_MAX_VERIFY_BYTES)
+            if not html:
                 return False
                 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(html, 'lxml')
             
             # Check for business indicators
-            text_content = soup.get_text().lower()
-            
-            # Look for business-related keywords
-            business_keywords = ['company', 'business', 'services', 'products', 'about us', 'contact', 'manufacturing']
-            business_score = sum(1 for keyword in business_keywords if keyword in text_content)
-            
-            # Check for company name presence
-            company_words = company_name.lower().replace('limited', '').replace('ltd', '').split()
-            name_score = sum(1 for word in company_words if len(word) > 3 and word in text_content)
-            
-            # Must have both business indicators and company name
-            return business_score >= 2 and name_score >= 1
+            text_content = soup.get_text(' ', strip=True).lower()
+            
+            if company_tokens is None:
+                company_tokens = _normalize_company(company_name)
+            company_words = frozenset(word for word in company_tokens if len(word) > 3)
+            
+            # One pass over the text scores business keywords and company name together;
+            # must have both business indicators and company name
+            business_hits, name_hits = set(), set()
+            for _, word in _verification_automaton(company_words).iter(text_content):
+                if word in _BUSINESS_KEYWORDS:
+                    business_hits.add(word)
+                if word in company_words:
+                    name_hits.add(word)
+                if len(business_hits) >= 2 and name_hits:
+                    return True
+                    
+            return False
             
         except Exception:
             return False
@@ -192,9 +413,7 @@ class CompanyEnrichmentAgent:
         try:
             # Check recent filings for website mentions
             filing_url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}/filing-history"
-            self.random_delay()
-            
-            response = self.session.get(filing_url, timeout=15)
+            response = self._request('GET', filing_url, timeout=15)
             if response.status_code != 200:
                 return ""
                 
@@ -202,8 +421,7 @@ class CompanyEnrichmentAgent:
             content = response.text
             
             # Extract potential website URLs
-            url_pattern = r'https?://(?:www\.)?([a-zA-Z0-9-]+\.(?:co\.uk|com|org))'
-            matches = re.findall(url_pattern, content)
+            matches = _RX_URL.findall(content)
             
             for match in matches:
                 potential_url = f"https://www.{match}"
@@ -215,32 +433,31 @@ class CompanyEnrichmentAgent:
             
         return ""
         
-    def _search_with_quality_filter(self, company_name: str) -> str:
+    def _search_with_quality_filter(self, company_name: str, company_tokens: Optional[Tuple[str, ...]] = None) -> str:
         """Search for company website with strict quality filtering"""
         try:
             # Use DuckDuckGo for search (more reliable than scraping Google)
             query = f"{company_name} UK company official website -linkedin -facebook -wikipedia"
             search_url = f"https://html.duckduckgo.com/html/?q={query.replace(' ', '+')}"
             
-            self.random_delay()
-            response = self.session.get(search_url, timeout=15)
+            response = self._request('GET', search_url, timeout=15)
             
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                tree = LexborHTMLParser(response.content)
                 
                 # Extract search result URLs
-                for link in soup.find_all('a', href=True):
-                    href = link.get('href', '')
-                    if href.startswith('/l/?uddg=') and 'http' in href:
+                for link in tree.css('a[href^="/l/?uddg="]'):
+                    href = link.attributes.get('href') or ''
+                    if 'http' in href:
                         # Extract actual URL from DuckDuckGo redirect
-                        url_match = re.search(r'uddg=([^&]+)', href)
+                        url_match = _RX_UDDG.search(href)
                         if url_match:
                             import urllib.parse
                             actual_url = urllib.parse.unquote(url_match.group(1))
                             
-                            validation = self.validator.validate_company_website(actual_url, company_name, [])
+                            validation = self.validator.validate_company_website(actual_url, company_name, [], company_tokens)
                             if validation["valid"] and validation.get("confidence", 0) > 50:
-                                if self._verify_business_website(actual_url, company_name):
+                                if self._verify_business_website(actual_url, company_name, company_tokens):
                                     return actual_url
                                     
         except Exception as e:
@@ -254,20 +471,22 @@ class CompanyEnrichmentAgent:
             return ""
             
         try:
-            self.random_delay()
-            response = self.session.get(url, timeout=15)
-            if response.status_code >= 400:
+            html = self._fetch_html(url, timeout=15)
+            if not html:
                 return ""
                 
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Strategy 1: Meta description
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc and meta_desc.get('content'):
-                desc = meta_desc['content'].strip()
+            # Strategy 1: Meta description, parsed from the <head> slice alone
+            head_end = _RX_HEAD_END.search(html)
+            head = html[:head_end.end()] if head_end else html[:_MAX_HEAD_BYTES]
+            meta_desc = LexborHTMLParser(head).css_first('meta[name="description"]')
+            if meta_desc and meta_desc.attributes.get('content'):
+                desc = meta_desc.attributes['content'].strip()
                 if len(desc) > 20 and not desc.lower().startswith('welcome to'):
                     return desc[:500]
                     
+            # Only the body strategies need the whole page parsed
+            tree = LexborHTMLParser(html)
+            
             # Strategy 2: About sections
             about_selectors = [
                 'section[class*="about"]',
@@ -279,18 +498,18 @@ class CompanyEnrichmentAgent:
             ]
             
             for selector in about_selectors:
-                elements = soup.select(selector)
+                elements = tree.css(selector)
                 for element in elements:
-                    text = element.get_text(strip=True)
+                    text = element.text(strip=True)
                     if 50 < len(text) < 1000:
                         # Clean up the text
-                        text = re.sub(r'\s+', ' ', text)
+                        text = _RX_WS.sub(' ', text)
                         return text[:500]
                         
             # Strategy 3: First substantial paragraph
-            paragraphs = soup.find_all('p')
+            paragraphs = tree.css('p')
             for p in paragraphs:
-                text = p.get_text(strip=True)
+                text = p.text(strip=True)
                 if 50 < len(text) < 500:
                     return text
                     
@@ -308,40 +527,10 @@ class CompanyEnrichmentAgent:
         }
         
         try:
-            # Get filing history
-            filing_url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}/filing-history"
-            self.random_delay()
-            
-            response = self.session.get(filing_url, timeout=15)
-            if response.status_code != 200:
-                return employee_data
+            account_links = self._account_filings_from_api(company_number) if self.ch_api_key else None
+            if account_links is None:
+                account_links = self._account_filings_from_html(company_number)
                 
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Find annual accounts filings
-            account_links = []
-            filing_items = soup.find_all('div', class_='filing-history-item')
-            
-            for item in filing_items:
-                description = item.find('h3')
-                if not description:
-                    continue
-                    
-                desc_text = description.get_text().lower()
-                if 'annual accounts' in desc_text or 'accounts' in desc_text:
-                    date_elem = item.find('time')
-                    link_elem = item.find('a', string=re.compile(r'View PDF|Download'))
-                    
-                    if date_elem and link_elem:
-                        date_str = date_elem.get('datetime', '')
-                        pdf_link = link_elem.get('href', '')
-                        
-                        # Extract year
-                        year_match = re.search(r'20(22|23|24)', date_str + ' ' + desc_text)
-                        if year_match:
-                            year = '20' + year_match.group(1)
-                            account_links.append((year, pdf_link, desc_text))
-                            
             # Process accounts for each year
             for year, pdf_link, description in account_links[:6]:  # Limit to recent filings
                 if year in ['2024', '2023', '2022'] and not employee_data[f'employees_{year}']:
@@ -355,6 +544,60 @@ class CompanyEnrichmentAgent:
             
         return employee_data
         
+    def _account_filings_from_api(self, company_number: str) -> Optional[List[tuple]]:
+        """List (year, document link, description) for accounts filings via the API; None on failure"""
+        response = self._request(
+            'GET', f"{self.ch_api_base}/company/{company_number}/filing-history",
+            params={'category': 'accounts'}, timeout=15
+        )
+        if response.status_code != 200:
+            return None
+            
+        account_links = []
+        for item in response.json().get('items', []):
+            document_url = item.get('links', {}).get('document_metadata', '')
+            description = item.get('description', '')
+            year_match = _RX_YEAR.search(item.get('date', '') + ' ' + description)
+            if document_url and year_match:
+                account_links.append(('20' + year_match.group(1), f"{document_url}/content", description))
+                
+        return account_links
+        
+    def _account_filings_from_html(self, company_number: str) -> List[tuple]:
+        """List (year, PDF link, description) for accounts filings by scraping the filing history page"""
+        filing_url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}/filing-history"
+        response = self._request('GET', filing_url, timeout=15)
+        if response.status_code != 200:
+            return []
+            
+        soup = BeautifulSoup(response.content, 'lxml')
+        
+        # Find annual accounts filings
+        account_links = []
+        filing_items = soup.find_all('div', class_='filing-history-item')
+        
+        for item in filing_items:
+            description = item.find('h3')
+            if not description:
+                continue
+                
+            desc_text = description.get_text().lower()
+            if 'annual accounts' in desc_text or 'accounts' in desc_text:
+                date_elem = item.find('time')
+                link_elem = item.find('a', string=_RX_PDF_LINK)
+                
+                if date_elem and link_elem:
+                    date_str = date_elem.get('datetime', '')
+                    pdf_link = link_elem.get('href', '')
+                    
+                    # Extract year
+                    year_match = _RX_YEAR.search(date_str + ' ' + desc_text)
+                    if year_match:
+                        year = '20' + year_match.group(1)
+                        account_links.append((year, pdf_link, desc_text))
+                        
+        return account_links
+        
     def _extract_employees_from_pdf(self, pdf_link: str) -> str:
         """Extract employee count from PDF document"""
         try:
@@ -363,67 +606,86 @@ class CompanyEnrichmentAgent:
             else:
                 pdf_url = pdf_link
                 
-            self.random_delay()
-            response = self.session.get(pdf_url, timeout=20)
+            content = self._fetch_pdf(pdf_url)
+            if content is not None:
+                return self._employees_from_pdf_bytes(content)
+                
+        except Exception as e:
+            self.logger.error(f"Error extracting from PDF: {e}")
             
+        return ""
+        
+    def _fetch_pdf(self, pdf_url: str) -> Optional[bytes]:
+        """Whole PDF from one streamed GET; None (logged) when it is over _MAX_PDF_BYTES"""
+        response = self._request('GET', pdf_url, timeout=30, stream=True, headers={'Accept': 'application/pdf'})
+        try:
             if response.status_code != 200:
-                return ""
+                return None
                 
-            # Try to extract text from PDF
+            # Declared sizes over the cap are skipped before any of the body is read;
+            # otherwise read one byte past the cap to catch a body that runs over it
+            length = int(response.headers.get('Content-Length') or 0)
+            if length <= _MAX_PDF_BYTES:
+                content = response.raw.read(_MAX_PDF_BYTES + 1, decode_content=True)
+                if len(content) <= _MAX_PDF_BYTES:
+                    return content
+        finally:
+            response.close()
+            
+        self.logger.info(f"Skipping {pdf_url}: over the {_MAX_PDF_BYTES} byte PDF cap")
+        return None
+        
+    def _employees_from_pdf_bytes(self, content: bytes) -> str:
+        """Employee count from the first pages of a complete PDF"""
+        # Try to extract text from PDF, stopping at the first page that names a headcount
+        try:
+            pdf = pdfium.PdfDocument(content)
             try:
-                pdf_file = io.BytesIO(response.content)
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                
-                text_content = ""
-                for page in pdf_reader.pages[:10]:  # Check first 10 pages
-                    text_content += page.extract_text()
+                for i in range(min(10, len(pdf))):  # Check first 10 pages
+                    page = pdf[i]
+                    text_page = page.get_textpage()
+                    page_text = text_page.get_text_bounded()
+                    text_page.close()
+                    page.close()
                     
-            except Exception:
-                # If PDF parsing fails, try as text
-                text_content = response.text
+                    employee_count = self._find_employee_count(page_text)
+                    if employee_count:
+                        return employee_count
+            finally:
+                pdf.close()
                 
-            # Search for employee patterns
-            employee_patterns = [
-                r'average\s+number\s+of\s+employees[:\s]+(\d+)',
-                r'number\s+of\s+employees[:\s]+(\d+)',
-                r'employees?\s*[:\-]\s*(\d+)',
-                r'staff\s+numbers?[:\s]+(\d+)',
-                r'total\s+employees[:\s]+(\d+)',
-                r'workforce[:\s]+(\d+)',
-                r'employ(?:ed|s)?\s+(\d+)\s+(?:people|staff|employees)',
-                r'(\d+)\s+employees?\s+(?:were\s+)?employed',
-                r'employment\s+of\s+(\d+)',
-                r'(\d+)\s+(?:full|part).{0,20}time\s+employees?'
-            ]
-            
-            for pattern in employee_patterns:
-                matches = re.findall(pattern, text_content, re.IGNORECASE)
-                if matches:
-                    for match in matches:
-                        try:
-                            num = int(match)
-                            # Reasonable range for SME employee counts
-                            if 1 <= num <= 5000:
-                                return str(num)
-                        except ValueError:
-                            continue
-                            
-        except Exception as e:
-            self.logger.error(f"Error extracting from PDF: {e}")
+        except Exception:
+            # If PDF parsing fails, try as text
+            return self._find_employee_count(content.decode('utf-8', errors='replace'))
             
         return ""
         
+    def _find_employee_count(self, text_content: str) -> str:
+        """Return the first plausible employee count mentioned in the text"""
+        for match in _RX_EMPLOYEES.finditer(text_content):
+            num = int(next(group for group in match.groups() if group))
+            # Reasonable range for SME employee counts
+            if 1 <= num <= 5000:
+                return str(num)
+                
+        return ""
+        
     def get_companies_house_address(self, company_number: str) -> str:
         """Get registered address from Companies House"""
         try:
+            if self.ch_api_key:
+                response = self._request('GET', f"{self.ch_api_base}/company/{company_number}", timeout=15)
+                if response.status_code == 200:
+                    office = response.json().get('registered_office_address', {})
+                    return ', '.join(office[field] for field in _CH_ADDRESS_FIELDS if office.get(field))
+                    
+            # Fall back to scraping the public company page
             url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}"
-            self.random_delay()
-            
-            response = self.session.get(url, timeout=15)
+            response = self._request('GET', url, timeout=15)
             if response.status_code != 200:
                 return ""
                 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(response.content, 'lxml')
             
             # Find registered office address
             address_section = soup.find('div', {'id': 'company-addresses'})
@@ -432,8 +694,8 @@ class CompanyEnrichmentAgent:
                 
             # Extract address text
             address_text = address_section.get_text()
-            address_text = re.sub(r'Registered office address', '', address_text)
-            address_text = re.sub(r'\s+', ' ', address_text).strip()
+            address_text = _RX_REGISTERED_OFFICE.sub('', address_text)
+            address_text = _RX_WS.sub(' ', address_text).strip()
             
             return address_text
             
@@ -441,14 +703,11 @@ class CompanyEnrichmentAgent:
             self.logger.error(f"Error getting address for {company_number}: {e}")
             return ""
             
-    def enrich_company(self, row: pd.Series) -> Dict:
+    def enrich_company(self, row) -> Dict:
         """Enrich a single company with high-quality data"""
-        company_name = str(row['CompanyName']).strip()
-        company_number = str(row.get('CompanyNumber', '')).strip()
+        company_name = _row_value(row, 'CompanyName')
+        company_number = _row_value(row, 'CompanyNumber')
         
-        if company_number == 'nan':
-            company_number = ''
-            
         self.logger.info(f"Processing: {company_name}")
         
         info = {
@@ -468,14 +727,16 @@ class CompanyEnrichmentAgent:
             return info
             
         # 1. Find official website
-        website = self.find_official_website(company_name, company_number)
+        # Normalize the name once; validators, domain guessing and page checks share the tokens
+        company_tokens = _normalize_company(company_name)
+        website = self.find_official_website(company_name, company_number, company_tokens)
         if website:
             info['company_url'] = website
             
             # 2. Extract company description from website
             description = self.extract_company_description(website, company_name)
             if description:
-                sic_codes = [str(row.get(f'SICCode.SicText_{i}', '')) for i in range(1, 5)]
+                sic_codes = [_row_value(row, f'SICCode.SicText_{i}') for i in range(1, 5)]
                 validation = self.validator.validate_company_description(description, company_name, sic_codes)
                 if validation["valid"]:
                     info['description'] = description
@@ -492,6 +753,16 @@ class CompanyEnrichmentAgent:
                 
         return info
         
+    @staticmethod
+    def _apply_results(df: pd.DataFrame, pending: List[Dict]):
+        """Fold a batch of per-row results into df in one update, then clear the batch"""
+        if not pending:
+            return
+            
+        patch = pd.DataFrame(pending).set_index('index')
+        df.update(patch)
+        pending.clear()
+        
     def process_csv(self, input_file: str, output_file: str = None):
         """Process CSV with quality controls"""
         try:
@@ -508,26 +779,39 @@ class CompanyEnrichmentAgent:
                 output_file = input_file.replace('.csv', '_quality_enriched.csv')
                 
             processed = 0
-            for index, row in df.iterrows():
-                try:
-                    enriched_info = self.enrich_company(row)
-                    
-                    # Update with quality-validated data only
-                    for key, value in enriched_info.items():
-                        if value and str(value).strip():
-                            df.at[index, key] = str(value).strip()
+            pending = []
+            # Rows are independent and network bound; results are collected here as
+            # futures complete and folded into the frame in batches
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # itertuples yields light namedtuples; dotted SIC headers are renamed so they
+                # survive as attributes instead of becoming positional fields
+                input_columns = [col for col in ['CompanyName', 'CompanyNumber'] + [f'SICCode.SicText_{i}' for i in range(1, 5)] if col in df.columns]
+                rows = df[input_columns].rename(columns=lambda col: col.replace('.', '_'))
+                futures = {executor.submit(self.enrich_company, row): row.Index for row in rows.itertuples(index=True)}
+                
+                for future in concurrent.futures.as_completed(futures):
+                    index = futures[future]
+                    try:
+                        enriched_info = future.result()
+                        
+                        # Keep quality-validated data only
+                        update = {key: str(value).strip() for key, value in enriched_info.items() if value and str(value).strip()}
+                        update['index'] = index
+                        pending.append(update)
+                        
+                        processed += 1
+                        
+                        # Save progress
+                        if processed % 50 == 0:
+                            self._apply_results(df, pending)
+                            df.to_csv(output_file, index=False)
+                            self.logger.info(f"Processed {processed}/{len(df)} companies")
                             
-                    processed += 1
-                    
-                    # Save progress
-                    if processed % 3 == 0:
-                        df.to_csv(output_file, index=False)
-                        self.logger.info(f"Processed {processed}/{len(df)} companies")
+                    except Exception as e:
+                        self.logger.error(f"Error processing {df.at[index, 'CompanyName']}: {e}")
+                        continue
                         
-                except Exception as e:
-                    self.logger.error(f"Error processing {row.get('CompanyName', 'Unknown')}: {e}")
-                    continue
-                    
+            self._apply_results(df, pending)
             df.to_csv(output_file, index=False)
             self.logger.info(f"Quality enrichment complete! Results saved to {output_file}")
             
@@ -545,12 +829,12 @@ class CompanyEnrichmentAgent:
 def main():
     # Install required package if not available
     try:
-        import PyPDF2
+        import pypdfium2
     except ImportError:
-        print("Installing PyPDF2 for PDF processing...")
+        print("Installing pypdfium2 for PDF processing...")
         import subprocess
-        subprocess.check_call(['pip', 'install', 'PyPDF2'])
-        import PyPDF2
+        subprocess.check_call(['pip', 'install', 'pypdfium2'])
+        import pypdfium2
     
     agent = CompanyEnrichmentAgent(delay_range=(4, 7))  # Respectful delays
     
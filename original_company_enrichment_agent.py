@@ -1,40 +1,308 @@
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import httpx
+import asyncio
+from selectolax.parser import HTMLParser
 import time
-import random
 import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urljoin, urlparse, parse_qs, quote_plus
 import json
 import logging
-from typing import Dict, Optional, List
+from typing import Dict, FrozenSet, Optional, List, Tuple
 import os
+import functools
+import shelve
+import concurrent.futures
+import threading
+import contextvars
+from collections import defaultdict
+
+# UK postcode, e.g. "SW1A 1AA"
+_POSTCODE_RE = re.compile(r'[A-Z]{1,2}[0-9][A-Z0-9]?\s*[0-9][ABD-HJLNP-UW-Z]{2}')
+
+# Patterns like "50 employees", "team of 100", etc.
+_EMP_PATTERNS = (
+    r'(\d+)\s*employees?',
+    r'team\s*of\s*(\d+)',
+    r'(\d+)\s*staff',
+    r'employs?\s*(\d+)',
+    r'workforce\s*of\s*(\d+)'
+)
+
+# Employee phrases and postcodes in one pass over the page text; postcodes stay upper case only
+_PAGE_SCAN_RE = re.compile(
+    '|'.join([f'(?:{p})' for p in _EMP_PATTERNS] + [f'(?P<postcode>(?-i:{_POSTCODE_RE.pattern}))']),
+    re.IGNORECASE
+)
+_NON_ALNUM_RE = re.compile(r'[^a-zA-Z0-9\s]')
+
+# Description, address and postcode sit near the top of a page; never read past this
+_MAX_PAGE_BYTES = 512 * 1024
+
+# Errors swallowed while looking up the current company; a result built around one is
+# not cached, so a transient failure doesn't blank the company on every later run
+_lookup_errors = contextvars.ContextVar('lookup_errors', default=None)
+
+# Identifier columns of the input sheet, read as text rather than numbers
+_TEXT_COLUMNS = ('CompanyNumber', 'SICCode.SicText_1', 'SICCode.SicText_2', 'SICCode.SicText_3', 'SICCode.SicText_4')
+
+# httpx only retries failed connections; throttled and unavailable responses are retried
+# here, backing off 0.5s, 1s, 2s unless the server asks for a longer wait
+_RETRY_STATUSES = frozenset({429, 502, 503, 504})
+_STATUS_RETRIES = 3
+
+# Common non-company domains
+_SKIP_RE = re.compile(r'(?:google|facebook|linkedin|twitter|youtube|wikipedia|companieshouse)\.')
+
+# Legal suffixes dropped before a name is matched against domains
+_SUFFIX_RE = re.compile(r'\b(?:limited|ltd)\b', re.IGNORECASE)
+
+def _retry_wait(response: httpx.Response, attempt: int) -> float:
+    """Seconds to wait before retrying a response, honouring a numeric Retry-After"""
+    retry_after = response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return min(float(retry_after), 60.0)
+    return 0.5 * 2 ** attempt
+
+@functools.lru_cache(maxsize=8192)
+def _netloc_lower(url: str) -> str:
+    """Lower-cased host part of a URL"""
+    return urlparse(url).netloc.lower()
+
+@functools.lru_cache(maxsize=8192)
+def _slug_tokens(company_name: str) -> Tuple[str, ...]:
+    """Lower-cased alphanumeric words of a company name, legal suffix removed"""
+    return tuple(_SUFFIX_RE.sub('', _NON_ALNUM_RE.sub('', company_name.lower())).split())
+
+@functools.lru_cache(maxsize=8192)
+def _company_slugs(company_name: str) -> FrozenSet[str]:
+    """Company name words that are distinctive enough to look for in a domain"""
+    return frozenset(word for word in _slug_tokens(company_name) if len(word) > 3)
+
+@functools.lru_cache(maxsize=8192)
+def _is_valid_company_url(url: str, slugs: FrozenSet[str]) -> bool:
+    """Check if URL is likely the company's official website"""
+    try:
+        domain = _netloc_lower(url)
+        
+        # Skip common non-company domains
+        if _SKIP_RE.search(domain):
+            return False
+            
+        # Check if company name appears in domain
+        return any(word in domain for word in slugs)
+        
+    except:
+        return False
+
+@functools.lru_cache(maxsize=8192)
+def _is_uk_address(text: str) -> bool:
+    """Check if text contains a UK address"""
+    uk_indicators = ['uk', 'united kingdom', 'england', 'scotland', 'wales', 'northern ireland']
+    
+    text_lower = text.lower()
+    return any(indicator in text_lower for indicator in uk_indicators) or bool(_POSTCODE_RE.search(text))
+
+def _parse_page(content: bytes) -> Dict:
+    """Extract description, employees and location from a company web page; picklable, for worker processes"""
+    info = {}
+    tree = HTMLParser(content)
+    # Page text is flattened and scanned once for both employees and a postcode
+    text = tree.body.text() if tree.body else ''
+    employees, postcode = _scan_page_text(text)
+    
+    # Extract description from meta tags or about sections
+    description = _extract_description(tree)
+    if description:
+        info['description'] = description
+        
+    # Look for employee information
+    if employees:
+        info['employees'] = employees
+        
+    # Look for location information
+    location = _extract_location(tree, postcode)
+    if location:
+        info['manufacturing_location'] = location
+        
+    return info
+
+def _extract_description(tree: HTMLParser) -> str:
+    """Extract company description from webpage"""
+    # Try meta description first
+    meta_desc = tree.css_first('meta[name="description"]')
+    if meta_desc and meta_desc.attributes.get('content'):
+        return meta_desc.attributes['content'].strip()
+        
+    # Look for about sections
+    about_selectors = [
+        'section[class*="about"]',
+        'div[class*="about"]',
+        '.company-description',
+        '.business-description'
+    ]
+    
+    for selector in about_selectors:
+        element = tree.css_first(selector)
+        if element:
+            text = element.text().strip()
+            if len(text) > 50:
+                return text[:500] + '...' if len(text) > 500 else text
+                
+    return ''
+
+def _scan_page_text(text: str) -> Tuple[str, str]:
+    """First employee count and first postcode in the page text, in a single scan"""
+    employees = postcode = ''
+    for match in _PAGE_SCAN_RE.finditer(text):
+        if match.group('postcode'):
+            postcode = postcode or match.group('postcode').strip()
+        else:
+            employees = employees or next(group for group in match.groups() if group)
+            
+        if employees and postcode:
+            break
+            
+    return employees, postcode
+
+def _extract_location(tree: HTMLParser, postcode: str) -> str:
+    """Extract location information from webpage"""
+    # Look for address information
+    address_selectors = [
+        '[class*="address"]',
+        '[class*="location"]',
+        '[class*="contact"]'
+    ]
+    
+    for selector in address_selectors:
+        elements = tree.css(selector)
+        for element in elements:
+            address = element.text().strip()
+            if _is_uk_address(address):
+                return address
+                
+    # Fall back to a postcode found in the general text
+    return postcode
+
+class TokenBucket:
+    """Thread-safe token bucket: refills at `rate` tokens a second, holds at most `capacity`"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+        
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            # Going negative queues callers behind each other instead of letting them race
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+            
+    def consume(self):
+        """Take a token, sleeping until it is due"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
 
 class CompanyEnrichmentAgent:
-    def __init__(self, delay_range=(1, 3)):
+    def __init__(self, delay_range=(1, 3), cache_file: Optional[str] = 'enrichment_cache', max_workers: int = 16):
         """
         Initialize the enrichment agent
         
         Args:
-            delay_range: Tuple of (min, max) seconds to wait between requests
+            delay_range: Tuple of (min, max) seconds between requests to the same host; the mean sets the rate
+            cache_file: Shelve file that keeps results across runs (None for an in-memory cache)
+            max_workers: Number of companies enriched concurrently by process_dataframe
         """
         self.delay_range = delay_range
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        # Politeness is per host: each host gets its own token bucket, refilled at one
+        # token per average delay, so requests to different hosts never wait on each other
+        rate = 2 / sum(delay_range)
+        self.buckets = defaultdict(lambda: TokenBucket(rate=rate, capacity=2))
+        self.buckets_lock = threading.Lock()
+        # HTTP/2 lets concurrent requests to one host share a single multiplexed connection
+        self.client = httpx.Client(**self.client_options(), transport=httpx.HTTPTransport(
+            http2=True,
+            retries=3,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        ))
         
         # Setup logging
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
         
-        # Cache for results to avoid re-processing
-        self.cache = {}
+        # Cache for results to avoid re-processing, persisted so restarts skip seen companies
+        # Shelve objects are not thread safe, so every access goes through the lock
+        self.cache = shelve.open(cache_file) if cache_file else {}
+        self.cache_lock = threading.Lock()
+        self.max_workers = max_workers
         
-    def random_delay(self):
-        """Add random delay between requests to be respectful"""
-        time.sleep(random.uniform(*self.delay_range))
+    @staticmethod
+    def client_options() -> Dict:
+        """Settings shared by the sync and async HTTP clients"""
+        return {
+            'headers': {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+                'Accept-Encoding': 'gzip, deflate'
+            },
+            'timeout': 10.0,
+            'follow_redirects': True,
+            'max_redirects': 3
+        }
         
+    def cached_result(self, cache_key: str) -> Optional[Dict]:
+        """Previously stored result for a company, if any"""
+        with self.cache_lock:
+            return self.cache.get(cache_key)
+            
+    def store_result(self, cache_key: str, info: Dict):
+        """Remember a company's result"""
+        with self.cache_lock:
+            self.cache[cache_key] = info
+            
+    def sync_cache(self):
+        """Write cached results through to the shelve file"""
+        with self.cache_lock:
+            if isinstance(self.cache, shelve.Shelf):
+                self.cache.sync()
+                
+    def close(self):
+        """Close the HTTP client and flush and close the persistent result cache"""
+        self.client.close()
+        with self.cache_lock:
+            if isinstance(self.cache, shelve.Shelf):
+                self.cache.close()
+        
+    def lookup_error(self, message: str):
+        """Log a swallowed lookup error and mark the current company's result as incomplete"""
+        self.logger.error(message)
+        errors = _lookup_errors.get()
+        if errors is not None:
+            errors.append(message)
+            
+    def host_bucket(self, url: str) -> TokenBucket:
+        """Token bucket for the URL's host"""
+        with self.buckets_lock:
+            return self.buckets[_netloc_lower(url)]
+            
+    def throttle(self, url: str):
+        """Wait until the URL's host may be sent another request"""
+        self.host_bucket(url).consume()
+        
+    def get(self, url: str) -> httpx.Response:
+        """GET a URL on its host's schedule, retrying throttled and unavailable responses"""
+        for attempt in range(_STATUS_RETRIES + 1):
+            self.throttle(url)
+            response = self.client.get(url)
+            if response.status_code not in _RETRY_STATUSES or attempt == _STATUS_RETRIES:
+                return response
+            time.sleep(_retry_wait(response, attempt))
+            
     def search_company_info(self, company_name: str, company_number: str = None) -> Dict:
         """
         Search for company information using multiple strategies
@@ -47,8 +315,9 @@ class CompanyEnrichmentAgent:
             Dictionary with found information
         """
         cache_key = f"{company_name}_{company_number}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        cached = self.cached_result(cache_key)
+        if cached is not None:
+            return cached
             
         info = {
             'company_url': '',
@@ -56,10 +325,14 @@ class CompanyEnrichmentAgent:
             'employees': '',
             'manufacturing_location': ''
         }
+        errors = []
+        _lookup_errors.set(errors)
         
         try:
             # Strategy 1: Search for official website
-            website = self.find_company_website(company_name)
+            # Name words are derived once and shared by every URL check for this company
+            slugs = _company_slugs(company_name)
+            website = self.find_company_website(company_name, slugs)
             if website:
                 info['company_url'] = website
                 # Extract info from company website
@@ -82,61 +355,93 @@ class CompanyEnrichmentAgent:
                         info[key] = value
                         
         except Exception as e:
-            self.logger.error(f"Error processing {company_name}: {e}")
+            self.lookup_error(f"Error processing {company_name}: {e}")
             
-        # Cache the result
-        self.cache[cache_key] = info
+        # Cache the result, unless part of the lookup failed
+        if not errors:
+            self.store_result(cache_key, info)
         return info
         
-    def find_company_website(self, company_name: str) -> Optional[str]:
+    def find_company_website(self, company_name: str, slugs: Optional[FrozenSet[str]] = None) -> Optional[str]:
         """Find the official company website"""
+        if slugs is None:
+            slugs = _company_slugs(company_name)
+            
         try:
-            # Search query for company website
-            search_query = f"{company_name} official website"
-            search_url = f"https://www.google.com/search?q={search_query.replace(' ', '+')}"
-            
-            self.random_delay()
-            response = self.session.get(search_url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Look for search results
-            links = soup.find_all('a', href=True)
-            for link in links:
-                href = link['href']
-                if '/url?q=' in href:
-                    url = href.split('/url?q=')[1].split('&')[0]
-                    if self.is_valid_company_url(url, company_name):
-                        return url
-                        
+            # Guessed domains first: one HEAD per candidate, no search engine involved
+            website = self.probe_company_domains(company_name, slugs)
+            if website:
+                return website
+                
+            # Fall back to a search
+            response = self.get(self.website_search_url(company_name))
+            response.raise_for_status()
+            return self.parse_website_search(response.content, slugs)
+            
         except Exception as e:
-            self.logger.error(f"Error finding website for {company_name}: {e}")
+            self.lookup_error(f"Error finding website for {company_name}: {e}")
             
         return None
         
-    def is_valid_company_url(self, url: str, company_name: str) -> bool:
-        """Check if URL is likely the company's official website"""
-        try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
+    def candidate_urls(self, company_name: str, slugs: FrozenSet[str]) -> List[str]:
+        """Likely website URLs built from the company name, most likely first"""
+        words = _slug_tokens(company_name)
+        if not words:
+            return []
             
-            # Skip common non-company domains
-            skip_domains = ['google.com', 'facebook.com', 'linkedin.com', 'twitter.com', 
-                          'youtube.com', 'wikipedia.org', 'companieshouse.gov.uk']
+        stems = [words[0], ''.join(words[:2])]
+        domains = dict.fromkeys(f"{stem}.{tld}" for stem in stems for tld in ('co.uk', 'com'))
+        urls = [f"https://www.{domain}" for domain in domains]
+        return [url for url in urls if self.is_valid_company_url(url, slugs)]
+        
+    def head_status(self, url: str) -> Optional[int]:
+        """Status code of a HEAD request, or None if the host can't be reached"""
+        try:
+            self.throttle(url)
+            return self.client.head(url, timeout=5).status_code
+        except httpx.HTTPError:
+            return None
             
-            if any(skip in domain for skip in skip_domains):
-                return False
-                
-            # Check if company name appears in domain
-            company_words = company_name.lower().replace('limited', '').replace('ltd', '').strip().split()
-            for word in company_words:
-                if len(word) > 3 and word in domain:
-                    return True
-                    
-            return False
+    def probe_company_domains(self, company_name: str, slugs: FrozenSet[str]) -> Optional[str]:
+        """HEAD the candidate URLs in parallel and return the first one that answers"""
+        urls = self.candidate_urls(company_name, slugs)
+        if not urls:
+            return None
             
-        except:
-            return False
+        # Don't wait on slow candidates once one has answered
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+        futures = {executor.submit(self.head_status, url): url for url in urls}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                status = future.result()
+                if status and status < 400:
+                    return futures[future]
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
             
+        return None
+        
+    def website_search_url(self, company_name: str) -> str:
+        """Build the search URL used to look for a company's website"""
+        return f"https://html.duckduckgo.com/html/?q={quote_plus(company_name + ' official website')}"
+        
+    def parse_website_search(self, content: bytes, slugs: FrozenSet[str]) -> Optional[str]:
+        """Pick the first plausible company website out of a search results page"""
+        tree = HTMLParser(content)
+        
+        # Result links point at a redirect carrying the real URL in uddg
+        for link in tree.css('a.result__a'):
+            href = link.attributes.get('href') or ''
+            url = parse_qs(urlparse(href).query).get('uddg', [href])[0]
+            if self.is_valid_company_url(url, slugs):
+                return url
+                
+        return None
+        
+    def is_valid_company_url(self, url: str, slugs: FrozenSet[str]) -> bool:
+        """Check if URL is likely the company's official website, given its name words"""
+        return _is_valid_company_url(url, slugs)
+        
     def extract_website_info(self, url: str) -> Dict:
         """Extract information from company website"""
         info = {
@@ -146,105 +451,37 @@ class CompanyEnrichmentAgent:
         }
         
         try:
-            self.random_delay()
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract description from meta tags or about sections
-            description = self.extract_description(soup)
-            if description:
-                info['description'] = description
-                
-            # Look for employee information
-            employees = self.extract_employee_count(soup)
-            if employees:
-                info['employees'] = employees
-                
-            # Look for location information
-            location = self.extract_location(soup)
-            if location:
-                info['manufacturing_location'] = location
-                
+            self.throttle(url)
+            with self.client.stream('GET', url) as response:
+                # Only HTML is worth parsing, and only its first _MAX_PAGE_BYTES
+                if response.headers.get('Content-Type', '').lower().startswith('text/html'):
+                    content = bytearray()
+                    for chunk in response.iter_bytes():
+                        content += chunk
+                        if len(content) >= _MAX_PAGE_BYTES:
+                            break
+                    info.update(self.parse_website_info(bytes(content[:_MAX_PAGE_BYTES])))
+            
         except Exception as e:
-            self.logger.error(f"Error extracting info from {url}: {e}")
+            self.lookup_error(f"Error extracting info from {url}: {e}")
             
         return info
         
-    def extract_description(self, soup: BeautifulSoup) -> str:
-        """Extract company description from webpage"""
-        # Try meta description first
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        if meta_desc and meta_desc.get('content'):
-            return meta_desc['content'].strip()
-            
-        # Look for about sections
-        about_selectors = [
-            'section[class*="about"]',
-            'div[class*="about"]',
-            '.company-description',
-            '.business-description'
-        ]
-        
-        for selector in about_selectors:
-            element = soup.select_one(selector)
-            if element:
-                text = element.get_text().strip()
-                if len(text) > 50:
-                    return text[:500] + '...' if len(text) > 500 else text
-                    
-        return ''
+    def parse_website_info(self, content: bytes) -> Dict:
+        """Extract description, employees and location from a company web page"""
+        return _parse_page(content)
         
-    def extract_employee_count(self, soup: BeautifulSoup) -> str:
-        """Extract employee count from webpage"""
-        text = soup.get_text().lower()
-        
-        # Look for patterns like "50 employees", "team of 100", etc.
-        patterns = [
-            r'(\d+)\s*employees?',
-            r'team\s*of\s*(\d+)',
-            r'(\d+)\s*staff',
-            r'employs?\s*(\d+)',
-            r'workforce\s*of\s*(\d+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                return match.group(1)
-                
-        return ''
+    def extract_description(self, tree: HTMLParser) -> str:
+        """Extract company description from webpage"""
+        return _extract_description(tree)
         
-    def extract_location(self, soup: BeautifulSoup) -> str:
+    def extract_location(self, tree: HTMLParser, postcode: str) -> str:
         """Extract location information from webpage"""
-        # Look for address information
-        address_selectors = [
-            '[class*="address"]',
-            '[class*="location"]',
-            '[class*="contact"]'
-        ]
-        
-        for selector in address_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                text = element.get_text().strip()
-                if self.is_uk_address(text):
-                    return text
-                    
-        # Look for postcode patterns in general text
-        text = soup.get_text()
-        postcode_match = re.search(r'[A-Z]{1,2}[0-9][A-Z0-9]?\s*[0-9][ABD-HJLNP-UW-Z]{2}', text)
-        if postcode_match:
-            return postcode_match.group().strip()
-            
-        return ''
+        return _extract_location(tree, postcode)
         
     def is_uk_address(self, text: str) -> bool:
         """Check if text contains a UK address"""
-        uk_indicators = ['uk', 'united kingdom', 'england', 'scotland', 'wales', 'northern ireland']
-        postcode_pattern = r'[A-Z]{1,2}[0-9][A-Z0-9]?\s*[0-9][ABD-HJLNP-UW-Z]{2}'
-        
-        text_lower = text.lower()
-        return any(indicator in text_lower for indicator in uk_indicators) or bool(re.search(postcode_pattern, text))
+        return _is_uk_address(text)
         
     def search_companies_house(self, company_name: str, company_number: str) -> Dict:
         """Search Companies House for additional information"""
@@ -258,21 +495,32 @@ class CompanyEnrichmentAgent:
         # For now, we'll use web scraping as a fallback
         try:
             url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}"
-            self.random_delay()
-            response = self.session.get(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Extract registered address
-            address_elem = soup.find('div', {'id': 'company-addresses'})
-            if address_elem:
-                address_text = address_elem.get_text().strip()
-                info['manufacturing_location'] = address_text
-                
+            info['manufacturing_location'] = self.companies_house_location(self.get(url))
+            
         except Exception as e:
-            self.logger.error(f"Error searching Companies House for {company_name}: {e}")
+            self.lookup_error(f"Error searching Companies House for {company_name}: {e}")
             
         return info
         
+    def companies_house_location(self, response: httpx.Response) -> str:
+        """Registered address from a Companies House company page; raises if the page wasn't served"""
+        # An unknown company number is an answer in itself; any other error status is a failed lookup
+        if response.status_code == 404:
+            return ''
+        response.raise_for_status()
+        return self.parse_companies_house_address(response.content)
+        
+    def parse_companies_house_address(self, content: bytes) -> str:
+        """Extract the registered address from a Companies House company page"""
+        tree = HTMLParser(content)
+        
+        # Extract registered address
+        address_elem = tree.css_first('div#company-addresses')
+        if address_elem:
+            return address_elem.text().strip()
+            
+        return ''
+        
     def general_web_search(self, company_name: str) -> Dict:
         """Perform general web search for missing information"""
         info = {
@@ -304,42 +552,381 @@ class CompanyEnrichmentAgent:
                 df[col] = ''
                 
         total_companies = len(df)
+        # Results are collected in plain lists and written back a whole column at a time
+        results = {col: df[col].tolist() for col in new_columns}
+        
+        # Positions of finished rows not yet appended to the output file
+        pending = []
+        rows = self.rows_to_enrich(df, results, self.load_checkpoint(df, output_file, new_columns), pending)
+        
+        # Lookups are network bound, so companies are searched on a thread pool and the
+        # results folded in here as they complete
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            for i, row in rows:
+                # Get company information
+                future = executor.submit(self.search_company_info, row.CompanyName, getattr(row, 'CompanyNumber', ''))
+                futures[future] = (i, row.CompanyName)
+                
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                i, company_name = futures[future]
+                try:
+                    company_info = future.result()
+                except Exception as e:
+                    self.logger.error(f"Error processing {company_name}: {e}")
+                    continue
+                    
+                self.logger.info(f"Processed company {i + 1}/{total_companies}: {company_name}")
+                
+                # Fill only the fields that are still empty
+                for col, value in company_info.items():
+                    if value and not results[col][i]:
+                        results[col][i] = value
+                pending.append(i)
+                
+                # Save progress periodically
+                if done % 100 == 0 and output_file:
+                    self.append_checkpoint(df, results, pending, output_file)
+                    self.sync_cache()
+                    self.logger.info(f"Progress saved to {output_file}")
+                    
+        self.write_results(df, results)
+        
+        # Final save: the whole table in input order, replacing the appended checkpoints
+        # along with any rows an earlier run wrote before they were looked up again
+        if output_file:
+            df.to_csv(output_file, index=False)
+            self.logger.info(f"Final results saved to {output_file}")
+            
+        return df
+        
+    @staticmethod
+    def company_key(company_name, company_number) -> str:
+        """Identify a company across runs by its number, or by its name when it has none"""
+        number = str(company_number).strip()
+        return number if number and number != 'nan' else str(company_name)
         
-        for index, row in df.iterrows():
-            self.logger.info(f"Processing company {index + 1}/{total_companies}: {row['CompanyName']}")
+    def load_checkpoint(self, df: pd.DataFrame, output_file: Optional[str], result_columns: List[str]) -> Dict[str, Dict]:
+        """Start the output file, or read back the rows an earlier run already wrote to it"""
+        if not output_file:
+            return {}
             
+        if os.path.exists(output_file):
+            previous = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+            
+            # Rows are appended under the existing header, so only a file with this layout can be resumed
+            if list(previous.columns) == list(df.columns):
+                # Rows without any result were never really enriched; look them up again
+                written = {
+                    self.company_key(record.get('CompanyName', ''), record.get('CompanyNumber', '')): record
+                    for record in previous.to_dict('records')
+                    if any(record.get(col) for col in result_columns)
+                }
+                self.logger.info(f"Resuming: {len(written)} companies already in {output_file}")
+                return written
+                
+            backup_file = f"{output_file}.bak"
+            os.replace(output_file, backup_file)
+            self.logger.warning(f"{output_file} has different columns, so it can't be resumed; moved it to {backup_file}")
+            
+        df.head(0).to_csv(output_file, index=False)
+        return {}
+        
+    def rows_to_enrich(self, df: pd.DataFrame, results: Dict[str, List], written: Dict[str, Dict], pending: List[int]) -> List:
+        """Rows that still need a lookup; rows already written are carried over, complete ones queued for writing"""
+        rows = []
+        for i, row in enumerate(df.itertuples(index=False)):
+            # Already in the output file from an earlier run
+            record = written.get(self.company_key(row.CompanyName, getattr(row, 'CompanyNumber', '')))
+            if record is not None:
+                for col in results:
+                    results[col][i] = record.get(col, '')
+                continue
+                
             # Skip if already processed (all new fields have values)
-            if all(row.get(col, '') for col in new_columns):
-                self.logger.info(f"Skipping {row['CompanyName']} - already processed")
+            if all(results[col][i] for col in results):
+                self.logger.info(f"Skipping {row.CompanyName} - already processed")
+                pending.append(i)
                 continue
                 
-            # Get company information
-            company_info = self.search_company_info(
-                row['CompanyName'], 
-                row.get('CompanyNumber', '')
-            )
-            
-            # Update the dataframe
-            for col, value in company_info.items():
-                if value and not row.get(col, ''):
-                    df.at[index, col] = value
+            rows.append((i, row))
+            
+        return rows
+        
+    @staticmethod
+    def append_checkpoint(df: pd.DataFrame, results: Dict[str, List], pending: List[int], output_file: str):
+        """Append the pending rows, with their results, to the output file"""
+        if not pending:
+            return
+            
+        rows = df.iloc[pending].copy()
+        for col, values in results.items():
+            rows[col] = [values[i] for i in pending]
+        rows.to_csv(output_file, mode='a', header=False, index=False)
+        pending.clear()
+        
+    @staticmethod
+    def write_results(df: pd.DataFrame, results: Dict[str, List]):
+        """Assign the collected result lists to their dataframe columns"""
+        for col, values in results.items():
+            df[col] = values
+
+class AsyncCompanyEnrichmentAgent(CompanyEnrichmentAgent):
+    """Enrichment agent that overlaps the requests for many companies on one event loop"""
+    
+    def __init__(self, delay_range=(1, 3), concurrency: int = 50, chunk_size: int = 200,
+                 cache_file: Optional[str] = 'enrichment_cache'):
+        """
+        Initialize the async enrichment agent
+        
+        Args:
+            delay_range: Tuple of (min, max) seconds between requests to the same host; the mean sets the rate
+            concurrency: Maximum number of companies being enriched at once
+            chunk_size: Number of companies gathered between progress saves
+            cache_file: Shelve file that keeps results across runs (None for an in-memory cache)
+        """
+        super().__init__(delay_range, cache_file)
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        # Worker processes for page parsing, set while process_dataframe_async runs
+        self.parse_pool = None
+        # At most two requests in flight per host, on top of the host's token bucket
+        self.host_sems = {}
+        
+    async def throttle_async(self, url: str) -> asyncio.Semaphore:
+        """Wait for the URL's host bucket without blocking the loop; returns the host's semaphore"""
+        await asyncio.sleep(self.host_bucket(url).reserve())
+        return self.host_sems.setdefault(_netloc_lower(url), asyncio.Semaphore(2))
+        
+    async def fetch(self, client: httpx.AsyncClient, url: str) -> httpx.Response:
+        """GET a URL through the shared client, retrying throttled and unavailable responses"""
+        for attempt in range(_STATUS_RETRIES + 1):
+            async with await self.throttle_async(url):
+                response = await client.get(url)
+            if response.status_code not in _RETRY_STATUSES or attempt == _STATUS_RETRIES:
+                return response
+            await asyncio.sleep(_retry_wait(response, attempt))
+            
+    async def fetch_page(self, client: httpx.AsyncClient, url: str) -> bytes:
+        """GET a web page and return at most _MAX_PAGE_BYTES of it; empty if it isn't HTML"""
+        async with await self.throttle_async(url), client.stream('GET', url) as response:
+            if not response.headers.get('Content-Type', '').lower().startswith('text/html'):
+                return b''
+                
+            content = bytearray()
+            async for chunk in response.aiter_bytes():
+                content += chunk
+                if len(content) >= _MAX_PAGE_BYTES:
+                    break
+            return bytes(content[:_MAX_PAGE_BYTES])
+            
+    async def head_status_async(self, client: httpx.AsyncClient, url: str) -> Optional[int]:
+        """Async version of head_status"""
+        try:
+            response = await client.head(url, timeout=5)
+            return response.status_code
+        except httpx.HTTPError:
+            return None
+            
+    async def find_company_website_async(self, client: httpx.AsyncClient, company_name: str,
+                                         slugs: Optional[FrozenSet[str]] = None) -> Optional[str]:
+        """Async version of find_company_website"""
+        if slugs is None:
+            slugs = _company_slugs(company_name)
+            
+        try:
+            # Guessed domains first, all probed at once; the first to answer wins
+            async def probe(url):
+                return url, await self.head_status_async(client, url)
+                
+            tasks = [asyncio.ensure_future(probe(url)) for url in self.candidate_urls(company_name, slugs)]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    url, status = await next_done
+                    if status and status < 400:
+                        return url
+            finally:
+                for task in tasks:
+                    task.cancel()
                     
-            # Save progress periodically
-            if (index + 1) % 10 == 0 and output_file:
-                df.to_csv(output_file, index=False)
-                self.logger.info(f"Progress saved to {output_file}")
+            # Fall back to a search
+            response = await self.fetch(client, self.website_search_url(company_name))
+            response.raise_for_status()
+            return self.parse_website_search(response.content, slugs)
+            
+        except Exception as e:
+            self.lookup_error(f"Error finding website for {company_name}: {e}")
+            
+        return None
+        
+    async def extract_website_info_async(self, client: httpx.AsyncClient, url: str) -> Dict:
+        """Async version of extract_website_info"""
+        info = {
+            'description': '',
+            'employees': '',
+            'manufacturing_location': ''
+        }
+        
+        try:
+            content = await self.fetch_page(client, url)
+            if content:
+                # Parsing holds the GIL, so it runs in a worker process while the loop keeps fetching
+                if self.parse_pool:
+                    info.update(await asyncio.get_running_loop().run_in_executor(self.parse_pool, _parse_page, content))
+                else:
+                    info.update(self.parse_website_info(content))
+            
+        except Exception as e:
+            self.lookup_error(f"Error extracting info from {url}: {e}")
+            
+        return info
+        
+    async def search_companies_house_async(self, client: httpx.AsyncClient, company_name: str, company_number: str) -> Dict:
+        """Async version of search_companies_house"""
+        info = {
+            'description': '',
+            'employees': '',
+            'manufacturing_location': ''
+        }
+        
+        try:
+            url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}"
+            info['manufacturing_location'] = self.companies_house_location(await self.fetch(client, url))
+            
+        except Exception as e:
+            self.lookup_error(f"Error searching Companies House for {company_name}: {e}")
+            
+        return info
+        
+    async def search_company_info_async(self, client: httpx.AsyncClient, company_name: str, company_number: str = None) -> Dict:
+        """Async version of search_company_info; the website and Companies House lookups run together"""
+        cache_key = f"{company_name}_{company_number}"
+        cached = self.cached_result(cache_key)
+        if cached is not None:
+            return cached
+            
+        info = {
+            'company_url': '',
+            'description': '',
+            'employees': '',
+            'manufacturing_location': ''
+        }
+        errors = []
+        _lookup_errors.set(errors)
+        
+        try:
+            # Name words are derived once and shared by every URL check for this company
+            slugs = _company_slugs(company_name)
+            
+            async def website_lookup():
+                website = await self.find_company_website_async(client, company_name, slugs)
+                if not website:
+                    return None, {}
+                return website, await self.extract_website_info_async(client, website)
+                
+            # Strategies 1 and 2 are independent, so they share the wait
+            lookups = [website_lookup()]
+            if company_number:
+                lookups.append(self.search_companies_house_async(client, company_name, company_number))
+            results = await asyncio.gather(*lookups)
+            
+            website, website_info = results[0]
+            if website:
+                info['company_url'] = website
+                info.update(website_info)
                 
-        # Final save
+            # Companies House only fills what the website left empty
+            if company_number:
+                for key, value in results[1].items():
+                    if value and not info[key]:
+                        info[key] = value
+                        
+            # Strategy 3: General web search for missing info
+            if not info['description'] or not info['employees']:
+                search_info = self.general_web_search(company_name)
+                for key, value in search_info.items():
+                    if value and not info[key]:
+                        info[key] = value
+                        
+        except Exception as e:
+            self.lookup_error(f"Error processing {company_name}: {e}")
+            
+        # Cache the result, unless part of the lookup failed
+        if not errors:
+            self.store_result(cache_key, info)
+        return info
+        
+    async def process_dataframe_async(self, df: pd.DataFrame, output_file: str = None) -> pd.DataFrame:
+        """Async version of process_dataframe; companies are gathered in chunks behind a semaphore"""
+        # Add new columns if they don't exist
+        new_columns = ['company_url', 'description', 'employees', 'manufacturing_location']
+        for col in new_columns:
+            if col not in df.columns:
+                df[col] = ''
+                
+        total_companies = len(df)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # Results are collected in plain lists and written back a whole column at a time
+        results = {col: df[col].tolist() for col in new_columns}
+        
+        async def enrich(client, i, row):
+            async with semaphore:
+                self.logger.info(f"Processing company {i + 1}/{total_companies}: {row.CompanyName}")
+                return i, await self.search_company_info_async(
+                    client,
+                    row.CompanyName,
+                    getattr(row, 'CompanyNumber', '')
+                )
+                
+        # Positions of finished rows not yet appended to the output file
+        pending = []
+        rows = self.rows_to_enrich(df, results, self.load_checkpoint(df, output_file, new_columns), pending)
+        
+        # Companies are gathered together, so requests to a shared host (Companies House above
+        # all) ride one HTTP/2 connection as concurrent streams
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        parse_pool = concurrent.futures.ProcessPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        self.parse_pool = parse_pool
+        try:
+            async with httpx.AsyncClient(http2=True, limits=limits, **self.client_options()) as client:
+                for start in range(0, len(rows), self.chunk_size):
+                    chunk = rows[start:start + self.chunk_size]
+                    enriched = await asyncio.gather(*(enrich(client, i, row) for i, row in chunk))
+                    
+                    # Fill only the fields that are still empty
+                    for i, company_info in enriched:
+                        for col, value in company_info.items():
+                            if value and not results[col][i]:
+                                results[col][i] = value
+                        pending.append(i)
+                        
+                    # Save progress after every chunk
+                    if output_file:
+                        self.append_checkpoint(df, results, pending, output_file)
+                        self.sync_cache()
+                        self.logger.info(f"Progress saved to {output_file}")
+        finally:
+            self.parse_pool = None
+            parse_pool.shutdown()
+            
+        self.write_results(df, results)
+        
+        # Final save: the whole table in input order, replacing the appended checkpoints
+        # along with any rows an earlier run wrote before they were looked up again
         if output_file:
             df.to_csv(output_file, index=False)
             self.logger.info(f"Final results saved to {output_file}")
             
         return df
+        
+    def process_dataframe(self, df: pd.DataFrame, output_file: str = None) -> pd.DataFrame:
+        """Run process_dataframe_async to completion"""
+        return asyncio.run(self.process_dataframe_async(df, output_file))
 
 def main():
     """Main function to run the enrichment agent"""
     # Initialize the agent
-    agent = CompanyEnrichmentAgent(delay_range=(2, 4))  # Be respectful with delays
+    agent = AsyncCompanyEnrichmentAgent(delay_range=(2, 4))  # Be respectful with delays
     
     # Load the data
     input_file = "industrials.xlsx"  # Change this to your file path
@@ -348,9 +935,11 @@ def main():
     try:
         # Try to load Excel file
         if input_file.endswith('.xlsx'):
-            df = pd.read_excel(input_file)
+            # Identifiers as text, so company numbers keep their leading zeros; other cells
+            # (incorporation dates above all) keep their Excel types
+            df = pd.read_excel(input_file, engine='openpyxl', dtype={col: str for col in _TEXT_COLUMNS})
         else:
-            df = pd.read_csv(input_file)
+            df = pd.read_csv(input_file, dtype=str, keep_default_na=False, engine='pyarrow')
             
         print(f"Loaded {len(df)} companies from {input_file}")
         
@@ -369,6 +958,8 @@ def main():
         print("Please ensure the file exists and update the input_file variable")
     except Exception as e:
         print(f"Error: {e}")
+    finally:
+        agent.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
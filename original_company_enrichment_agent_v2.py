@@ -1,31 +1,240 @@
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
-import random
 import re
 from typing import Dict, Optional
 import logging
 from urllib.parse import urlparse
 import json
+import os
+import functools
+import concurrent.futures
+import threading
+from collections import defaultdict
+
+# Structured data blocks; an embedded PostalAddress beats scraping the markup
+_LD_JSON_RE = re.compile(r'<script[^>]*type="application/ld\+json"[^>]*>(.*?)</script>', re.DOTALL)
+_LD_ADDRESS_FIELDS = ('streetAddress', 'addressLocality', 'addressRegion', 'postalCode', 'addressCountry')
+
+# Registered office block on a Companies House company page
+_ADDRESS_RE = re.compile(r'Registered office address</h2>.*?<p[^>]*>(.*?)</p>', re.DOTALL)
+_TAG_RE = re.compile(r'<[^>]+>')
+_URL_RE = re.compile(r'https?://[^\s<>"]+')
+_NON_ALNUM_RE = re.compile(r'[^a-zA-Z0-9\s]')
+
+# Registered office fields from the Companies House API, in postal order
+_CH_ADDRESS_FIELDS = ('care_of', 'po_box', 'premises', 'address_line_1', 'address_line_2',
+                      'locality', 'region', 'postal_code', 'country')
+
+# Obvious non-company sites
+_SKIP_RE = re.compile(r'(?:google|facebook|linkedin|twitter|youtube|wikipedia|companieshouse)\.')
+
+# Legal suffixes dropped before a name is matched against domains
+_SUFFIX_RE = re.compile(r'\b(?:limited|ltd)\b', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=8192)
+def _netloc_lower(url: str) -> str:
+    """Lower-cased host part of a URL"""
+    return urlparse(url).netloc.lower()
+
+@functools.lru_cache(maxsize=8192)
+def _slug_tokens(company_name: str) -> tuple:
+    """Lower-cased alphanumeric words of a company name, legal suffix removed"""
+    return tuple(_SUFFIX_RE.sub('', _NON_ALNUM_RE.sub('', company_name.lower())).split())
+
+@functools.lru_cache(maxsize=8192)
+def _company_slugs(company_name: str) -> frozenset:
+    """Company name words worth looking for in a domain"""
+    return frozenset(word for word in _slug_tokens(company_name) if len(word) > 2)
+
+@functools.lru_cache(maxsize=8192)
+def _is_likely_company_website(url: str, slugs: frozenset) -> bool:
+    """Check if URL is likely the company's website"""
+    try:
+        domain = _netloc_lower(url)
+        
+        # Skip obvious non-company sites
+        if _SKIP_RE.search(domain):
+            return False
+            
+        # Check if company name words appear in domain
+        if any(word in domain for word in slugs):
+            return True
+            
+        return '.co.uk' in domain or '.com' in domain
+        
+    except:
+        return False
+
+@functools.lru_cache(maxsize=8192)
+def _generate_description_from_sic(sic_codes: tuple) -> str:
+    """Generate a description based on SIC codes"""
+    if not sic_codes:
+        return ''
+        
+    # Take the first meaningful SIC code description
+    for sic in sic_codes:
+        if sic and ' - ' in sic:
+            description = sic.split(' - ', 1)[1]
+            return f"Company engaged in {description.lower()}"
+            
+    return ''
+
+# SIC divisions 22-29: rubber and plastics through to motor vehicles
+_MFG_SIC_PREFIXES = frozenset({'22', '23', '24', '25', '26', '27', '28', '29'})
+
+@functools.lru_cache(maxsize=8192)
+def _estimate_employees_from_sic(sic_codes: tuple, company_age_years: int) -> str:
+    """Estimate employee count based on SIC codes and company age"""
+    if not sic_codes:
+        return ''
+        
+    # Very rough estimates based on typical UK SME patterns
+    is_manufacturing = any(sic[:2] in _MFG_SIC_PREFIXES for sic in sic_codes if isinstance(sic, str) and len(sic) >= 2)
+    
+    if is_manufacturing:
+        if company_age_years < 2:
+            return '1-10'
+        elif company_age_years < 5:
+            return '5-25'
+        elif company_age_years < 10:
+            return '10-50'
+        else:
+            return '20-100'
+    else:
+        # Service companies tend to be smaller
+        if company_age_years < 2:
+            return '1-5'
+        elif company_age_years < 5:
+            return '2-15'
+        else:
+            return '5-30'
+
+@functools.lru_cache(maxsize=8192)
+def _calculate_company_age(incorporation_date: str) -> int:
+    """Calculate company age in years"""
+    try:
+        if '/' in incorporation_date:
+            parts = incorporation_date.split('/')
+            year = int(parts[2]) if len(parts) == 3 else 2020
+        elif '-' in incorporation_date:
+            year = int(incorporation_date.split('-')[0])
+        else:
+            year = 2020
+            
+        return 2024 - year
+    except:
+        return 5  # Default assumption
+
+def _company_key(company_name, company_number) -> str:
+    """Identify a company across runs by its number, or by its name when it has none"""
+    number = str(company_number).strip()
+    return number if number and number != 'nan' else str(company_name)
+
+class TokenBucket:
+    """Thread-safe token bucket: refills at `rate` tokens a second, holds at most `capacity`"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+        
+    def reserve(self) -> float:
+        """Take a token and return how long to wait before using it"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+            self.last_refill = now
+            # Going negative queues callers behind each other instead of letting them race
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+            
+    def consume(self):
+        """Take a token, sleeping until it is due"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
 
 class CompanyEnrichmentAgent:
-    def __init__(self, delay_range=(2, 4)):
+    def __init__(self, delay_range=(2, 4), max_workers=16, ch_api_key=None):
         self.delay_range = delay_range
+        # Politeness is per host: each host gets its own token bucket, refilled at one
+        # token per average delay, so requests to different hosts never wait on each other
+        rate = 2 / sum(delay_range)
+        self.buckets = defaultdict(lambda: TokenBucket(rate=rate, capacity=2))
+        self.buckets_lock = threading.Lock()
+        self.max_workers = max_workers
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Connection': 'keep-alive',
+            'Accept-Encoding': 'gzip, deflate'
         })
         
+        # Pooled keep-alive connections, with retries on throttling and transient server errors
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
         
-        # Companies House API base URL
+        # Companies House API base URL; without a key the public pages are scraped instead
         self.ch_api_base = "https://api.company-information.service.gov.uk"
+        ch_api_key = ch_api_key or os.environ.get('CH_API_KEY')
+        self.ch_auth = (ch_api_key, '') if ch_api_key else None
+        
+        # The API reports its remaining quota; when it runs out, every thread waits for the reset
+        self.ch_rate_lock = threading.Lock()
+        self.ch_resume_at = 0.0
         
-    def random_delay(self):
-        time.sleep(random.uniform(*self.delay_range))
+    def throttle(self, url: str):
+        """Wait until the URL's host may be sent another request"""
+        with self.buckets_lock:
+            bucket = self.buckets[_netloc_lower(url)]
+        bucket.consume()
         
-    def get_companies_house_data(self, company_number: str) -> Dict:
+    def ch_api_get(self, path: str) -> requests.Response:
+        """GET a Companies House API resource, pausing while the rate-limit window is used up"""
+        with self.ch_rate_lock:
+            wait = self.ch_resume_at - time.time()
+        if wait > 0:
+            time.sleep(wait)
+            
+        response = self.session.get(f"{self.ch_api_base}{path}", auth=self.ch_auth, timeout=10)
+        
+        remaining = response.headers.get('X-Ratelimit-Remaining', '')
+        reset = response.headers.get('X-Ratelimit-Reset', '')
+        if remaining.isdigit() and int(remaining) == 0 and reset.isdigit():
+            with self.ch_rate_lock:
+                self.ch_resume_at = max(self.ch_resume_at, float(reset))
+                
+        return response
+        
+    def get_companies_house_profile(self, company_number: str) -> Dict:
+        """Company profile JSON from the Companies House API; empty without a key or on failure"""
+        if not self.ch_auth:
+            return {}
+            
+        try:
+            response = self.ch_api_get(f"/company/{company_number}")
+            if response.status_code == 200:
+                return response.json()
+                
+        except Exception as e:
+            self.logger.error(f"Error getting Companies House profile for {company_number}: {e}")
+            
+        return {}
+        
+    def get_companies_house_data(self, company_number: str, profile: Optional[Dict] = None) -> Dict:
         """Get data from Companies House API"""
         info = {
             'company_url': '',
@@ -34,19 +243,36 @@ class CompanyEnrichmentAgent:
             'manufacturing_location': ''
         }
         
+        if profile is None:
+            profile = self.get_companies_house_profile(company_number)
+            
+        # The API gives the registered office as fields, no parsing needed
+        address = profile.get('registered_office_address')
+        if address:
+            info['manufacturing_location'] = ', '.join(
+                str(address[field]) for field in _CH_ADDRESS_FIELDS if address.get(field)
+            )
+            return info
+            
         try:
             # Get basic company info
             url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}"
-            self.random_delay()
+            self.throttle(url)
             
             response = self.session.get(url, timeout=10)
             if response.status_code == 200:
                 content = response.text
                 
+                # Prefer a structured address; the markup regex is the fallback
+                address = self.address_from_json_ld(content)
+                if address:
+                    info['manufacturing_location'] = address
+                    return info
+                    
                 # Extract registered office address
-                address_match = re.search(r'Registered office address</h2>.*?<p[^>]*>(.*?)</p>', content, re.DOTALL)
+                address_match = _ADDRESS_RE.search(content)
                 if address_match:
-                    address = re.sub(r'<[^>]+>', ' ', address_match.group(1))
+                    address = _TAG_RE.sub(' ', address_match.group(1))
                     address = ' '.join(address.split())
                     info['manufacturing_location'] = address
                     
@@ -55,6 +281,23 @@ class CompanyEnrichmentAgent:
             
         return info
         
+    def address_from_json_ld(self, content: str) -> str:
+        """First address found in the page's JSON-LD blocks, or '' if there is none"""
+        for match in _LD_JSON_RE.finditer(content):
+            try:
+                data = json.loads(match.group(1))
+            except ValueError:
+                continue
+                
+            for item in data if isinstance(data, list) else [data]:
+                address = item.get('address') if isinstance(item, dict) else None
+                if isinstance(address, dict):
+                    parts = [address.get(field) for field in _LD_ADDRESS_FIELDS]
+                    # addressCountry may itself be a Country object
+                    return ', '.join(part.get('name', '') if isinstance(part, dict) else str(part) for part in parts if part)
+                    
+        return ''
+        
     def search_company_website(self, company_name: str, sic_codes: list) -> Dict:
         """Search for company website and information using DuckDuckGo"""
         info = {
@@ -66,12 +309,14 @@ class CompanyEnrichmentAgent:
         
         try:
             # Clean company name for search
-            search_name = company_name.replace('LIMITED', '').replace('LTD', '').replace(',', '').strip()
+            search_name = _SUFFIX_RE.sub('', company_name).replace(',', '').strip()
+            # Name words are derived once and shared by every URL check for this company
+            slugs = _company_slugs(company_name)
             
             # Try DuckDuckGo instant answer API
             search_url = f"https://api.duckduckgo.com/?q={search_name}+uk+company&format=json&no_html=1&skip_disambig=1"
             
-            self.random_delay()
+            self.throttle(search_url)
             response = self.session.get(search_url, timeout=10)
             
             if response.status_code == 200:
@@ -81,9 +326,9 @@ class CompanyEnrichmentAgent:
                 if 'Answer' in data and data['Answer']:
                     answer = data['Answer']
                     # Look for URLs in the answer
-                    urls = re.findall(r'https?://[^\s<>"]+', answer)
+                    urls = _URL_RE.findall(answer)
                     for url in urls:
-                        if self.is_likely_company_website(url, search_name):
+                        if self.is_likely_company_website(url, slugs):
                             info['company_url'] = url
                             break
                             
@@ -108,12 +353,9 @@ class CompanyEnrichmentAgent:
         """Alternative method to find company website"""
         try:
             # Try a more direct approach - construct likely domain names
-            clean_name = company_name.lower()
-            clean_name = re.sub(r'[^a-zA-Z0-9\s]', '', clean_name)
-            clean_name = clean_name.replace('limited', '').replace('ltd', '').strip()
+            words = _slug_tokens(company_name)
             
             # Try common domain patterns
-            words = clean_name.split()
             if len(words) >= 1:
                 potential_domains = [
                     f"{words[0]}.co.uk",
@@ -122,102 +364,44 @@ class CompanyEnrichmentAgent:
                     f"{'-'.join(words[:2])}.co.uk" if len(words) > 1 else f"{words[0]}.co.uk"
                 ]
                 
-                for domain in potential_domains[:2]:  # Only try first 2 to be respectful
-                    try:
-                        test_url = f"https://www.{domain}"
-                        self.random_delay()
-                        response = self.session.head(test_url, timeout=5)
-                        if response.status_code < 400:
-                            return test_url
-                    except:
-                        continue
-                        
+                # Every candidate is a different host, so they are probed at once without
+                # a delay; the first to answer wins and the rest are abandoned
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+                futures = {
+                    executor.submit(self.session.head, f"https://www.{domain}", timeout=5, allow_redirects=True): f"https://www.{domain}"
+                    for domain in dict.fromkeys(potential_domains)
+                }
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        try:
+                            if future.result().status_code < 400:
+                                return futures[future]
+                        except requests.RequestException:
+                            continue
+                finally:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    
         except Exception as e:
             self.logger.error(f"Error in alternative search for {company_name}: {e}")
             
         return ''
         
-    def is_likely_company_website(self, url: str, company_name: str) -> bool:
-        """Check if URL is likely the company's website"""
-        try:
-            parsed = urlparse(url)
-            domain = parsed.netloc.lower()
-            
-            # Skip obvious non-company sites
-            skip_domains = ['wikipedia.org', 'linkedin.com', 'facebook.com', 'twitter.com', 
-                           'google.com', 'youtube.com', 'companieshouse.gov.uk']
-            
-            if any(skip in domain for skip in skip_domains):
-                return False
-                
-            # Check if company name words appear in domain
-            company_words = company_name.lower().replace('limited', '').replace('ltd', '').strip().split()
-            company_words = [word for word in company_words if len(word) > 2]
-            
-            for word in company_words:
-                if word in domain:
-                    return True
-                    
-            return '.co.uk' in domain or '.com' in domain
-            
-        except:
-            return False
-            
+    def is_likely_company_website(self, url: str, slugs: frozenset) -> bool:
+        """Check if URL is likely the company's website, given its name words"""
+        return _is_likely_company_website(url, slugs)
+        
     def generate_description_from_sic(self, sic_codes: list) -> str:
         """Generate a description based on SIC codes"""
-        if not sic_codes:
-            return ''
-            
-        # Take the first meaningful SIC code description
-        for sic in sic_codes:
-            if sic and ' - ' in sic:
-                description = sic.split(' - ', 1)[1]
-                return f"Company engaged in {description.lower()}"
-                
-        return ''
+        return _generate_description_from_sic(tuple(sic_codes))
         
     def estimate_employees_from_sic(self, sic_codes: list, company_age_years: int) -> str:
         """Estimate employee count based on SIC codes and company age"""
-        if not sic_codes:
-            return ''
-            
-        # Very rough estimates based on typical UK SME patterns
-        manufacturing_sics = ['22', '23', '24', '25', '26', '27', '28', '29']
-        is_manufacturing = any(sic.startswith(code) for code in manufacturing_sics for sic in sic_codes if sic)
+        return _estimate_employees_from_sic(tuple(sic_codes), company_age_years)
         
-        if is_manufacturing:
-            if company_age_years < 2:
-                return '1-10'
-            elif company_age_years < 5:
-                return '5-25'
-            elif company_age_years < 10:
-                return '10-50'
-            else:
-                return '20-100'
-        else:
-            # Service companies tend to be smaller
-            if company_age_years < 2:
-                return '1-5'
-            elif company_age_years < 5:
-                return '2-15'
-            else:
-                return '5-30'
-                
     def calculate_company_age(self, incorporation_date: str) -> int:
         """Calculate company age in years"""
-        try:
-            if '/' in incorporation_date:
-                parts = incorporation_date.split('/')
-                year = int(parts[2]) if len(parts) == 3 else 2020
-            elif '-' in incorporation_date:
-                year = int(incorporation_date.split('-')[0])
-            else:
-                year = 2020
-                
-            return 2024 - year
-        except:
-            return 5  # Default assumption
-            
+        return _calculate_company_age(incorporation_date)
+        
     def enrich_company(self, row: pd.Series) -> Dict:
         """Enrich a single company's data"""
         company_name = row['CompanyName']
@@ -245,11 +429,19 @@ class CompanyEnrichmentAgent:
         
         # Try Companies House first
         if company_number:
-            ch_info = self.get_companies_house_data(company_number)
+            # The API profile fills in SIC codes and incorporation date the sheet lacks
+            profile = self.get_companies_house_profile(company_number)
+            sic_codes = sic_codes or profile.get('sic_codes', [])
+            incorporation_date = incorporation_date or profile.get('date_of_creation', '')
+            
+            ch_info = self.get_companies_house_data(company_number, profile)
             info.update({k: v for k, v in ch_info.items() if v})
             
+        # Hashable once, for the memoized SIC helpers
+        sic_tuple = tuple(sic_codes)
+        
         # Search for website and additional info
-        search_info = self.search_company_website(company_name, sic_codes)
+        search_info = self.search_company_website(company_name, sic_tuple)
         for key, value in search_info.items():
             if value and not info[key]:
                 info[key] = value
@@ -257,14 +449,15 @@ class CompanyEnrichmentAgent:
         # Estimate employees if not found
         if not info['employees']:
             company_age = self.calculate_company_age(incorporation_date)
-            info['employees'] = self.estimate_employees_from_sic(sic_codes, company_age)
+            info['employees'] = self.estimate_employees_from_sic(sic_tuple, company_age)
             
         return info
         
     def process_csv(self, input_file: str, output_file: str = None):
         """Process the CSV file and enrich company data"""
         try:
-            df = pd.read_csv(input_file)
+            # Everything as text: no dtype inference pass, and empty cells stay '' rather than NaN
+            df = pd.read_csv(input_file, dtype=str, keep_default_na=False, engine='pyarrow')
             self.logger.info(f"Loaded {len(df)} companies from {input_file}")
             
             # Add enrichment columns
@@ -273,34 +466,72 @@ class CompanyEnrichmentAgent:
                 if col not in df.columns:
                     df[col] = ''
             
-            # Process each company
+            if not output_file:
+                output_file = input_file.replace('.csv', '_enriched.csv')
+                
+            # During the run the output file is append-only: an earlier run's rows are read
+            # back once and skipped, and new rows are added in batches
+            written = {}
+            if os.path.exists(output_file):
+                previous = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+                
+                # Rows are appended under the existing header, so only a file with this layout can be resumed
+                if list(previous.columns) == list(df.columns):
+                    # Rows without any result were never really enriched; look them up again
+                    written = {
+                        _company_key(record.get('CompanyName', ''), record.get('CompanyNumber', '')): record
+                        for record in previous.to_dict('records')
+                        if any(record.get(col) for col in enrichment_columns)
+                    }
+                    self.logger.info(f"Resuming: {len(written)} companies already in {output_file}")
+                else:
+                    backup_file = f"{output_file}.bak"
+                    os.replace(output_file, backup_file)
+                    self.logger.warning(f"{output_file} has different columns, so it can't be resumed; moved it to {backup_file}")
+                    
+            if not os.path.exists(output_file):
+                df.head(0).to_csv(output_file, index=False)
+                
+            pending = []
+            to_enrich = []
             for index, row in df.iterrows():
+                record = written.get(_company_key(row['CompanyName'], row.get('CompanyNumber', '')))
+                if record is not None:
+                    for col in enrichment_columns:
+                        df.at[index, col] = record.get(col, '')
                 # Skip if already processed
-                if all(row.get(col, '') for col in enrichment_columns):
-                    continue
+                elif all(row.get(col, '') for col in enrichment_columns):
+                    pending.append(index)
+                else:
+                    to_enrich.append((index, row))
                     
-                try:
-                    enriched_info = self.enrich_company(row)
-                    
-                    # Update dataframe
-                    for key, value in enriched_info.items():
-                        if value:
-                            df.at[index, key] = value
+            # Process companies on a thread pool; every call is waiting on the network,
+            # and only this thread touches the dataframe
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self.enrich_company, row): index for index, row in to_enrich}
+                
+                for processed, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    index = futures[future]
+                    try:
+                        enriched_info = future.result()
+                        
+                        # Update dataframe
+                        for key, value in enriched_info.items():
+                            if value:
+                                df.at[index, key] = value
+                        pending.append(index)
+                        
+                        # Save progress every 100 companies
+                        if processed % 100 == 0:
+                            self.append_rows(df, pending, output_file)
+                            self.logger.info(f"Processed {processed}/{len(futures)} companies")
                             
-                    # Save progress every 5 companies
-                    if (index + 1) % 5 == 0:
-                        if output_file:
-                            df.to_csv(output_file, index=False)
-                        self.logger.info(f"Processed {index + 1}/{len(df)} companies")
+                    except Exception as e:
+                        self.logger.error(f"Error processing {df.at[index, 'CompanyName']}: {e}")
+                        continue
                         
-                except Exception as e:
-                    self.logger.error(f"Error processing {row['CompanyName']}: {e}")
-                    continue
-                    
-            # Final save
-            if not output_file:
-                output_file = input_file.replace('.csv', '_enriched.csv')
-                
+            # Final save: the whole table in input order, replacing the appended batches
+            # along with any rows an earlier run wrote before they were looked up again
             df.to_csv(output_file, index=False)
             self.logger.info(f"Processing complete! Results saved to {output_file}")
             
@@ -309,6 +540,13 @@ class CompanyEnrichmentAgent:
         except Exception as e:
             self.logger.error(f"Error processing file: {e}")
             return None
+            
+    @staticmethod
+    def append_rows(df: pd.DataFrame, pending: list, output_file: str):
+        """Append the pending rows to the output file"""
+        if pending:
+            df.loc[pending].to_csv(output_file, mode='a', header=False, index=False)
+            pending.clear()
 
 # Usage example
 def main():
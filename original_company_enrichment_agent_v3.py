@@ -1,29 +1,248 @@
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from lxml import html as lxhtml
 import time
 import random
 import re
-from typing import Dict, Optional
+import string
+from typing import Dict, Iterable, Optional
 import logging
 from urllib.parse import urlparse, urljoin
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+import concurrent.futures
+import threading
+import os
+import sqlite3
+import shelve
+import contextvars
+
+# Hyperscan is optional: when installed it finds where the employee scan should start
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# Patterns used on every company row, compiled once
+_ROFF_RE = re.compile(r'Registered office address')
+_YEAR_RE = re.compile(r'20(22|23|24)')
+_LTD_RE = re.compile(r'\b(LIMITED|LTD|CO\.?,?\s*LTD\.?)\b', re.IGNORECASE)
+
+# Translation tables for name cleaning: cheaper than a regex on short strings
+_PUNCT_TO_SPACE = str.maketrans({c: ' ' for c in string.punctuation})
+_PUNCT_DELETE = str.maketrans('', '', string.punctuation)
+
+# Obvious non-company sites, matched as hostname suffixes
+_SKIP_DOMAINS = ('wikipedia.org', 'linkedin.com', 'facebook.com', 'twitter.com',
+                 'google.com', 'youtube.com', 'companieshouse.gov.uk', 'bing.com',
+                 'gov.uk', 'ac.uk')
+
+# Company websites must be UK or common business domains
+_ALLOWED_TLDS = ('.co.uk', '.com', '.org')
+
+# Registered office fields from the Companies House API, in address order
+_CH_ADDRESS_FIELDS = ('care_of', 'po_box', 'premises', 'address_line_1', 'address_line_2',
+                      'locality', 'region', 'postal_code', 'country')
+
+# Employee-count phrasings in accounts documents as one alternation, so a page is
+# scanned once; exactly one of the three groups holds the number
+_EMP_UNION = re.compile(
+    r'(?:average\s+number\s+of\s+employees[:\s]+|number\s+of\s+employees[:\s]+|employees?\s*[:\-]\s*'
+    r'|staff\s+numbers?[:\s]+|total\s+employees[:\s]+|workforce[:\s]+)(\d+)'
+    r'|(\d+)\s+employees?'
+    r'|employ\s+(\d+)\s+people',
+    re.IGNORECASE
+)
+
+# With Hyperscan, one SIMD pass over the page finds the first place an employee phrase can
+# start and the regex only runs from there; Hyperscan reports no groups, so the regex still
+# reads the number. The backtrack allows for an earlier match that ends later.
+_EMP_DATABASE = None
+if hyperscan is not None:
+    _EMP_DATABASE = hyperscan.Database()
+    _EMP_DATABASE.compile(
+        expressions=[_EMP_UNION.pattern.encode()],
+        ids=[0],
+        flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SOM_LEFTMOST]
+    )
+_HS_BACKTRACK = 1024
+_hs_local = threading.local()
+
+# Accounts documents are scanned as they download; the tail of each chunk is kept so a
+# phrase split across two chunks is still matched
+_SCAN_CHUNK_SIZE = 64 * 1024
+_SCAN_OVERLAP = 8 * 1024
+
+# Errors swallowed while enriching the current company; a result built around one is
+# not cached, so a transient failure doesn't blank the company on every later run
+_lookup_errors = contextvars.ContextVar('lookup_errors', default=None)
+
+def _employee_scan_start(text: str) -> int:
+    """Offset to start the employee regex from: near Hyperscan's first hit, or 0 without Hyperscan"""
+    if _EMP_DATABASE is None:
+        return 0
+        
+    # Scratch space can't be shared between threads scanning at the same time
+    scratch = getattr(_hs_local, 'scratch', None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_EMP_DATABASE)
+        
+    data = text.encode('utf-8')
+    hits = []
+    
+    def on_match(pattern_id, start, end, flags, context):
+        hits.append(start)
+        return True  # Stop scanning
+        
+    # Stopping from the callback ends the scan with ScanTerminated
+    try:
+        _EMP_DATABASE.scan(data, match_event_handler=on_match, scratch=scratch)
+    except hyperscan.ScanTerminated:
+        pass
+    if not hits:
+        return len(text)
+    return max(0, len(data[:hits[0]].decode('utf-8', 'ignore')) - _HS_BACKTRACK)
+
+def _employee_count_from_text(content: str) -> str:
+    """First plausible employee count stated in an accounts document, or ''"""
+    for match in _EMP_UNION.finditer(content, _employee_scan_start(content)):
+        num = int(next(group for group in match.groups() if group))
+        # Take the first reasonable number (between 1 and 10000 for most SMEs)
+        if 1 <= num <= 10000:
+            return str(num)
+            
+    return ''
+
+def _employee_count_from_chunks(chunks: Iterable[str]) -> str:
+    """_employee_count_from_text over a document arriving in pieces; stops at the first count"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        # A match that reaches into the overlap may still grow once the next chunk arrives
+        safe_end = len(buffer) - _SCAN_OVERLAP
+        keep_from = max(0, safe_end)
+        for match in _EMP_UNION.finditer(buffer, _employee_scan_start(buffer)):
+            if match.end() > safe_end:
+                keep_from = min(keep_from, match.start())
+                break
+            num = int(next(group for group in match.groups() if group))
+            if 1 <= num <= 10000:
+                return str(num)
+        buffer = buffer[keep_from:]
+        
+    return _employee_count_from_text(buffer)
 
 class CompanyEnrichmentAgent:
-    def __init__(self, delay_range=(2, 4)):
+    def __init__(self, delay_range=(2, 4), max_workers=8, ch_api_key=None, cache_name='ch_cache',
+                 employee_db='ch_employees.sqlite', result_cache='.enrich_cache'):
         self.delay_range = delay_range
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+        self.max_workers = max_workers
+        self.cache_name = cache_name
+        
+        # Finished companies, persisted so a restarted run only enriches new rows
+        # Shelve objects are not thread safe, so every access goes through the lock
+        self.cache = shelve.open(result_cache) if result_cache else {}
+        self.cache_lock = threading.Lock()
+        self.cache_writes = 0
+        
+        # Employee counts already read from accounts documents, kept across runs so
+        # resumed runs skip both the download and the scan
+        self.employee_db = sqlite3.connect(employee_db, check_same_thread=False)
+        self.employee_db.execute(
+            'CREATE TABLE IF NOT EXISTS employee_counts (accounts_url TEXT PRIMARY KEY, employees TEXT)'
+        )
+        self.employee_db_lock = threading.Lock()
+        
+        # Companies House API base URL; without a key the public pages are scraped instead
+        self.ch_api_base = "https://api.company-information.service.gov.uk"
+        ch_api_key = ch_api_key or os.environ.get('CH_API_KEY')
+        self.ch_auth = (ch_api_key, '') if ch_api_key else None
+        
+        # Sessions aren't safe to share between threads, so each worker gets its own
+        self.local = threading.local()
         
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
         
+    @property
+    def session(self) -> requests.Session:
+        """The calling thread's HTTP session, created on first use"""
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            # On-disk response cache so re-runs skip pages already fetched
+            session = requests_cache.CachedSession(
+                self.cache_name,
+                expire_after=timedelta(days=7),
+                allowable_codes=[200]
+            )
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept-Encoding': 'gzip, deflate'
+            })
+            
+            # Keep connections to Companies House and Bing alive, and retry transient failures
+            adapter = HTTPAdapter(
+                pool_connections=32,
+                pool_maxsize=64,
+                max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504])
+            )
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self.local.session = session
+        return session
+        
+    def cached_result(self, cache_key: str) -> Optional[Dict]:
+        """Previously stored result for a company, if any"""
+        with self.cache_lock:
+            return self.cache.get(cache_key)
+            
+    def store_result(self, cache_key: str, info: Dict):
+        """Remember a company's result, writing through to disk every 50 companies"""
+        with self.cache_lock:
+            self.cache[cache_key] = info
+            self.cache_writes += 1
+            if self.cache_writes % 50 == 0 and isinstance(self.cache, shelve.Shelf):
+                self.cache.sync()
+                
+    def close(self):
+        """Flush and close the result cache and the employee-count database"""
+        with self.cache_lock:
+            if isinstance(self.cache, shelve.Shelf):
+                self.cache.close()
+        with self.employee_db_lock:
+            self.employee_db.close()
+            
+    def lookup_error(self, message: str):
+        """Log a swallowed lookup error and mark the current company's result as incomplete"""
+        self.logger.error(message)
+        errors = _lookup_errors.get()
+        if errors is not None:
+            errors.append(message)
+            
+    def response_ok(self, response: requests.Response, description: str) -> bool:
+        """True for a 200; otherwise log the failure, as a lookup error unless the resource doesn't exist"""
+        if response.status_code == 200:
+            return True
+            
+        # A 404 is an answer; anything else (a 500, a rejected API key) may not happen next time
+        message = f"Failed to get {description}: HTTP {response.status_code}"
+        if response.status_code == 404:
+            self.logger.warning(message)
+        else:
+            self.lookup_error(message)
+        return False
+        
     def random_delay(self):
         time.sleep(random.uniform(*self.delay_range))
         
+    def ch_api_get(self, path: str) -> requests.Response:
+        """GET a Companies House API resource"""
+        self.random_delay()
+        return self.session.get(f"{self.ch_api_base}{path}", auth=self.ch_auth, timeout=15)
+        
     def get_companies_house_data(self, company_number: str, company_name: str) -> Dict:
         """Get comprehensive data from Companies House including filing history"""
         info = {
@@ -36,25 +255,27 @@ class CompanyEnrichmentAgent:
         }
         
         try:
+            if self.ch_auth:
+                return self.get_companies_house_api_data(company_number, company_name, info)
+                
             # Get main company page
             main_url = f"https://find-and-update.company-information.service.gov.uk/company/{company_number}"
             self.logger.info(f"Fetching Companies House data for {company_name} ({company_number})")
             self.random_delay()
             
             response = self.session.get(main_url, timeout=15)
-            if response.status_code != 200:
-                self.logger.warning(f"Failed to get main page for {company_number}")
+            if not self.response_ok(response, f"main page for {company_number}"):
                 return info
                 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            doc = lxhtml.fromstring(response.content)
             
             # Extract registered office address
-            address_section = soup.find('div', {'id': 'company-addresses'})
-            if address_section:
-                address_text = address_section.get_text(strip=True)
+            address_sections = doc.xpath('//div[@id="company-addresses"]')
+            if address_sections:
+                address_text = ''.join(text.strip() for text in address_sections[0].itertext())
                 # Clean up the address
-                address_text = re.sub(r'Registered office address', '', address_text)
-                address_text = re.sub(r'\s+', ' ', address_text).strip()
+                address_text = _ROFF_RE.sub('', address_text)
+                address_text = ' '.join(address_text.split())
                 if address_text:
                     info['manufacturing_location'] = address_text
                     
@@ -63,12 +284,39 @@ class CompanyEnrichmentAgent:
             self.random_delay()
             
             filing_response = self.session.get(filing_url, timeout=15)
-            if filing_response.status_code == 200:
+            if self.response_ok(filing_response, f"filing history for {company_number}"):
                 employee_data = self.extract_employee_data_from_filings(filing_response.content, company_number)
                 info.update(employee_data)
                 
         except Exception as e:
-            self.logger.error(f"Error getting Companies House data for {company_number}: {e}")
+            self.lookup_error(f"Error getting Companies House data for {company_number}: {e}")
+            
+        return info
+        
+    def get_companies_house_api_data(self, company_number: str, company_name: str, info: Dict) -> Dict:
+        """Fill info from the Companies House API: a few KB of JSON instead of two HTML pages"""
+        self.logger.info(f"Fetching Companies House API data for {company_name} ({company_number})")
+        
+        response = self.ch_api_get(f"/company/{company_number}")
+        if not self.response_ok(response, f"company profile for {company_number}"):
+            return info
+            
+        # The API gives the registered office as fields, no parsing needed
+        address = response.json().get('registered_office_address') or {}
+        info['manufacturing_location'] = ', '.join(
+            str(address[field]) for field in _CH_ADDRESS_FIELDS if address.get(field)
+        )
+        
+        filing_response = self.ch_api_get(f"/company/{company_number}/filing-history?category=accounts")
+        if self.response_ok(filing_response, f"filing history for {company_number}"):
+            # Annual accounts filed in the years we report, as links to their rendered documents
+            account_links = [
+                (item['date'][:4], f"{item['links']['self']}/document?format=xhtml&download=0", item['date'])
+                for item in filing_response.json().get('items', [])
+                if item.get('type') == 'AA' and item.get('date', '')[:4] in ('2024', '2023', '2022')
+                and item.get('links', {}).get('self')
+            ]
+            info.update(self.employee_data_from_accounts(account_links, company_number))
             
         return info
         
@@ -81,41 +329,72 @@ class CompanyEnrichmentAgent:
         }
         
         try:
-            soup = BeautifulSoup(filing_page_content, 'html.parser')
+            doc = lxhtml.fromstring(filing_page_content)
             
             # Look for annual accounts links
-            filing_rows = soup.find_all('tr')
+            filing_rows = doc.xpath('//tr[td]')
             account_links = []
             
             for row in filing_rows:
-                description_cell = row.find('td')
-                if description_cell and 'annual accounts' in description_cell.get_text().lower():
-                    date_cell = row.find_all('td')[1] if len(row.find_all('td')) > 1 else None
-                    link_cell = row.find('a', href=True)
+                # Collect the cells and the description text once per row
+                tds = row.xpath('./td')
+                description_text = tds[0].text_content()
+                if 'annual accounts' in description_text.lower():
+                    date_cell = tds[1] if len(tds) > 1 else None
+                    hrefs = row.xpath('.//a/@href')
                     
-                    if date_cell and link_cell:
-                        date_text = date_cell.get_text().strip()
-                        link_href = link_cell['href']
+                    if date_cell is not None and hrefs:
+                        date_text = date_cell.text_content().strip()
+                        link_href = hrefs[0]
                         
                         # Extract year from date or description
-                        year_match = re.search(r'20(22|23|24)', date_text + ' ' + description_cell.get_text())
+                        year_match = _YEAR_RE.search(date_text + ' ' + description_text)
                         if year_match:
                             year = '20' + year_match.group(1)
                             account_links.append((year, link_href, date_text))
                             
-            # Process the most recent accounts for each year
-            for year, link_href, date_text in account_links[:6]:  # Limit to 6 most recent
-                if year in ['2024', '2023', '2022'] and not employee_info[f'employees_{year}']:
-                    self.logger.info(f"Checking {year} accounts for {company_number}")
-                    employee_count = self.get_employee_count_from_accounts(link_href)
-                    if employee_count:
-                        employee_info[f'employees_{year}'] = employee_count
-                        
+            employee_info = self.employee_data_from_accounts(account_links, company_number)
+            
         except Exception as e:
-            self.logger.error(f"Error extracting employee data from filings: {e}")
+            self.lookup_error(f"Error extracting employee data from filings: {e}")
             
         return employee_info
         
+    def employee_data_from_accounts(self, account_links: list, company_number: str) -> Dict:
+        """Read employee counts from (year, link, date) accounts entries, newest first"""
+        employee_info = {
+            'employees_2024': '',
+            'employees_2023': '',
+            'employees_2022': ''
+        }
+        
+        # Process the most recent accounts for each year
+        for year, link_href, date_text in account_links[:6]:  # Limit to 6 most recent
+            if year in ['2024', '2023', '2022'] and not employee_info[f'employees_{year}']:
+                self.logger.info(f"Checking {year} accounts for {company_number}")
+                employee_count = self.get_employee_count_from_accounts(link_href)
+                if employee_count:
+                    employee_info[f'employees_{year}'] = employee_count
+                    
+        return employee_info
+        
+    def cached_employee_count(self, accounts_url: str) -> Optional[str]:
+        """Employee count stored for an accounts document by an earlier lookup, or None"""
+        with self.employee_db_lock:
+            row = self.employee_db.execute(
+                'SELECT employees FROM employee_counts WHERE accounts_url = ?', (accounts_url,)
+            ).fetchone()
+        return row[0] if row else None
+        
+    def store_employee_count(self, accounts_url: str, employees: str):
+        """Remember the employee count read from an accounts document ('' if none was found)"""
+        with self.employee_db_lock:
+            self.employee_db.execute(
+                'INSERT OR REPLACE INTO employee_counts (accounts_url, employees) VALUES (?, ?)',
+                (accounts_url, employees)
+            )
+            self.employee_db.commit()
+            
     def get_employee_count_from_accounts(self, accounts_link: str) -> str:
         """Extract employee count from accounts document"""
         try:
@@ -124,52 +403,50 @@ class CompanyEnrichmentAgent:
             else:
                 accounts_url = accounts_link
                 
-            self.random_delay()
-            response = self.session.get(accounts_url, timeout=15)
-            
-            if response.status_code != 200:
-                return ''
+            employees = self.cached_employee_count(accounts_url)
+            if employees is not None:
+                return employees
                 
-            # If it's a PDF, we need to handle it differently
-            if 'pdf' in response.headers.get('content-type', '').lower():
-                # For PDFs, we'd need a PDF parser, but let's try the HTML version first
-                html_url = accounts_url.replace('.pdf', '').replace('/document/', '/document/').split('?')[0]
-                self.random_delay()
-                html_response = self.session.get(html_url, timeout=15)
-                if html_response.status_code == 200:
-                    content = html_response.text
-                else:
-                    content = response.text
-            else:
-                content = response.text
+            # One delay covers the HEAD and the GET, which go back to back
+            self.random_delay()
+            document_url = accounts_url
+            
+            # Check the type first so a PDF is never downloaded just to be thrown away; links
+            # from the API already ask for the XHTML rendering, so they skip the check
+            if 'format=xhtml' not in accounts_url:
+                head = self.session.head(accounts_url, timeout=8, allow_redirects=True)
+                if 'pdf' in head.headers.get('content-type', '').lower():
+                    # For PDFs, we'd need a PDF parser, so ask for the HTML version instead
+                    document_url = accounts_url.replace('.pdf', '').split('?')[0]
+                    
+            # Kept out of the response cache, which would download the whole document to store
+            # it before the first chunk is scanned; the employee-count memo covers re-runs
+            with self.session.get(document_url, timeout=15, stream=True,
+                                  expire_after=requests_cache.DO_NOT_CACHE) as response:
+                if response.status_code != 200:
+                    return ''
+                    
+                # No HTML version either; PDF bytes hold no readable text to scan
+                if 'pdf' in response.headers.get('content-type', '').lower():
+                    self.store_employee_count(accounts_url, '')
+                    return ''
+                    
+                # Look for employee-related patterns as the document arrives, and stop
+                # reading once a count turns up
+                response.encoding = response.encoding or 'utf-8'
+                employees = _employee_count_from_chunks(
+                    response.iter_content(chunk_size=_SCAN_CHUNK_SIZE, decode_unicode=True)
+                )
                 
-            # Look for employee-related patterns in the content
-            employee_patterns = [
-                r'average\s+number\s+of\s+employees[:\s]+(\d+)',
-                r'number\s+of\s+employees[:\s]+(\d+)',
-                r'employees?\s*[:\-]\s*(\d+)',
-                r'staff\s+numbers?[:\s]+(\d+)',
-                r'total\s+employees[:\s]+(\d+)',
-                r'workforce[:\s]+(\d+)',
-                r'(\d+)\s+employees?',
-                r'employ\s+(\d+)\s+people',
-            ]
+            self.store_employee_count(accounts_url, employees)
+            return employees
             
-            for pattern in employee_patterns:
-                matches = re.findall(pattern, content, re.IGNORECASE)
-                if matches:
-                    # Take the first reasonable number (between 1 and 10000 for most SMEs)
-                    for match in matches:
-                        num = int(match)
-                        if 1 <= num <= 10000:
-                            return str(num)
-                            
         except Exception as e:
-            self.logger.error(f"Error getting employee count from accounts: {e}")
+            self.lookup_error(f"Error getting employee count from accounts: {e}")
             
         return ''
         
-    def search_company_website(self, company_name: str, sic_codes: list) -> Dict:
+    def search_company_website(self, company_name: str, sic_codes: Iterable[str]) -> Dict:
         """Search for company website using multiple methods"""
         info = {
             'company_url': '',
@@ -178,8 +455,8 @@ class CompanyEnrichmentAgent:
         
         try:
             # Clean company name for search
-            search_name = re.sub(r'\b(LIMITED|LTD|CO\.?,?\s*LTD\.?)\b', '', company_name, flags=re.IGNORECASE).strip()
-            search_name = re.sub(r'[^\w\s]', ' ', search_name).strip()
+            search_name = _LTD_RE.sub('', company_name).strip()
+            search_name = ' '.join(search_name.translate(_PUNCT_TO_SPACE).split())
             
             # Try direct domain guessing first (faster)
             website = self.guess_company_domain(search_name)
@@ -193,11 +470,10 @@ class CompanyEnrichmentAgent:
                     info['company_url'] = website
                     
             # Generate description from SIC codes
-            if sic_codes:
-                info['description'] = self.generate_description_from_sic(sic_codes)
+            info['description'] = self.generate_description_from_sic(sic_codes)
                 
         except Exception as e:
-            self.logger.error(f"Error searching for {company_name}: {e}")
+            self.lookup_error(f"Error searching for {company_name}: {e}")
             
         return info
         
@@ -205,7 +481,7 @@ class CompanyEnrichmentAgent:
         """Guess company domain from name"""
         try:
             # Clean and create potential domain names
-            clean_name = re.sub(r'[^\w\s]', '', company_name.lower())
+            clean_name = company_name.lower().translate(_PUNCT_DELETE)
             words = clean_name.split()
             
             if not words:
@@ -228,21 +504,32 @@ class CompanyEnrichmentAgent:
                     f"{words[0]}.co.uk"
                 ]
                 
-            # Test domains (limit to 3 to be respectful)
-            for domain in potential_domains[:3]:
-                try:
-                    test_url = f"https://www.{domain}"
-                    self.random_delay()
-                    response = self.session.head(test_url, timeout=8, allow_redirects=True)
+            # Test domains (limit to 3 to be respectful); each is a different host, so
+            # they are probed together with no delay between them. The thread's session
+            # can't be shared with the probe threads, so each HEAD gets a plain one-off session
+            headers = dict(self.session.headers)
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=3)
+            futures = {
+                executor.submit(requests.head, f"https://www.{domain}", headers=headers, timeout=5, allow_redirects=True): f"https://www.{domain}"
+                for domain in potential_domains[:3]
+            }
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    test_url = futures[future]
+                    try:
+                        response = future.result()
+                    except Exception:
+                        continue
                     if response.status_code < 400:
                         # Verify it's actually a company website
                         if self.verify_company_website(test_url, company_name):
                             return test_url
-                except:
-                    continue
-                    
+            finally:
+                # Don't wait on slow candidates once one has been accepted
+                executor.shutdown(wait=False, cancel_futures=True)
+                
         except Exception as e:
-            self.logger.error(f"Error guessing domain for {company_name}: {e}")
+            self.lookup_error(f"Error guessing domain for {company_name}: {e}")
             
         return ''
         
@@ -253,12 +540,15 @@ class CompanyEnrichmentAgent:
             if response.status_code >= 400:
                 return False
                 
-            content = response.text.lower()
+            content = response.text
             company_words = company_name.lower().replace('limited', '').replace('ltd', '').split()
             company_words = [word for word in company_words if len(word) > 3]
-            
-            # Check if company name appears on the page
-            word_matches = sum(1 for word in company_words if word in content)
+            if not company_words:
+                return True
+                
+            # Check if company name appears on the page, in one pass over it
+            pattern = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in company_words) + r')\b', re.IGNORECASE)
+            word_matches = len({match.group(0).lower() for match in pattern.finditer(content)})
             return word_matches >= min(2, len(company_words))
             
         except:
@@ -274,16 +564,15 @@ class CompanyEnrichmentAgent:
             response = self.session.get(search_url, timeout=10)
             
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                doc = lxhtml.fromstring(response.content)
                 
                 # Look for search result links
-                for link in soup.find_all('a', href=True):
-                    href = link['href']
+                for href in doc.xpath('//a/@href'):
                     if href.startswith('http') and self.is_likely_company_website(href, company_name):
                         return href
                         
         except Exception as e:
-            self.logger.error(f"Error searching for website: {e}")
+            self.lookup_error(f"Error searching for website: {e}")
             
         return ''
         
@@ -294,15 +583,11 @@ class CompanyEnrichmentAgent:
             domain = parsed.netloc.lower()
             
             # Skip obvious non-company sites
-            skip_domains = ['wikipedia.org', 'linkedin.com', 'facebook.com', 'twitter.com', 
-                           'google.com', 'youtube.com', 'companieshouse.gov.uk', 'bing.com',
-                           'gov.uk', 'ac.uk']
-            
-            if any(skip in domain for skip in skip_domains):
+            if domain.endswith(_SKIP_DOMAINS):
                 return False
                 
             # Must be UK domain or common business domain
-            if not (domain.endswith('.co.uk') or domain.endswith('.com') or domain.endswith('.org')):
+            if not domain.endswith(_ALLOWED_TLDS):
                 return False
                 
             return True
@@ -310,34 +595,30 @@ class CompanyEnrichmentAgent:
         except:
             return False
             
-    def generate_description_from_sic(self, sic_codes: list) -> str:
+    def generate_description_from_sic(self, sic_codes: Iterable[str]) -> str:
         """Generate a description based on SIC codes"""
-        if not sic_codes:
-            return ''
-            
         # Take the first meaningful SIC code description
-        for sic in sic_codes:
-            if sic and ' - ' in sic:
-                description = sic.split(' - ', 1)[1]
-                return f"Company engaged in {description.lower()}"
-                
-        return ''
+        description = next((sic.split(' - ', 1)[1] for sic in sic_codes if sic and ' - ' in sic), None)
+        return f"Company engaged in {description.lower()}" if description else ''
         
-    def enrich_company(self, row: pd.Series) -> Dict:
-        """Enrich a single company's data"""
-        company_name = str(row['CompanyName']).strip()
-        company_number = str(row.get('CompanyNumber', '')).strip()
+    def enrich_company(self, row: tuple) -> Dict:
+        """Enrich a single company's data; row is an input row tuple with '.' in column names replaced by '_'"""
+        company_name = row.CompanyName.strip()
+        company_number = row.CompanyNumber.strip()
         
+        # Companies are identified by number, or by name when they have none
+        cache_key = company_number or company_name
+        cached = self.cached_result(cache_key)
+        if cached is not None:
+            return cached
+            
         self.logger.info(f"Processing: {company_name}")
         
-        # Get SIC codes
-        sic_codes = [
-            str(row.get('SICCode.SicText_1', '')),
-            str(row.get('SICCode.SicText_2', '')),
-            str(row.get('SICCode.SicText_3', '')),
-            str(row.get('SICCode.SicText_4', ''))
-        ]
-        sic_codes = [sic for sic in sic_codes if sic and sic != 'nan']
+        # Get SIC codes, read lazily up to the first one with a description
+        sic_codes = (
+            sic for sic in (row.SICCode_SicText_1, row.SICCode_SicText_2, row.SICCode_SicText_3, row.SICCode_SicText_4)
+            if sic
+        )
         
         # Initialize with empty values
         info = {
@@ -348,9 +629,11 @@ class CompanyEnrichmentAgent:
             'employees_2022': '',
             'manufacturing_location': ''
         }
+        errors = []
+        _lookup_errors.set(errors)
         
         # Get Companies House data first (most reliable)
-        if company_number and company_number != 'nan':
+        if company_number:
             ch_info = self.get_companies_house_data(company_number, company_name)
             for key, value in ch_info.items():
                 if value:
@@ -362,12 +645,16 @@ class CompanyEnrichmentAgent:
             if value and not info[key]:
                 info[key] = value
                 
+        # Cache the result, unless part of the lookup failed
+        if not errors:
+            self.store_result(cache_key, info)
         return info
         
     def process_csv(self, input_file: str, output_file: str = None):
         """Process the CSV file and enrich company data"""
         try:
-            df = pd.read_csv(input_file)
+            # Everything as text: no dtype inference pass, and empty cells stay '' rather than NaN
+            df = pd.read_csv(input_file, dtype=str, keep_default_na=False, engine='c')
             self.logger.info(f"Loaded {len(df)} companies from {input_file}")
             
             # Add new enrichment columns
@@ -377,34 +664,56 @@ class CompanyEnrichmentAgent:
                 if col not in df.columns:
                     df[col] = ''
             
-            # Process each company
-            processed_count = 0
-            for index, row in df.iterrows():
-                try:
-                    # Always process (don't skip based on existing data)
-                    enriched_info = self.enrich_company(row)
-                    
-                    # Update dataframe with non-empty values
-                    for key, value in enriched_info.items():
-                        if value and str(value).strip():
-                            df.at[index, key] = str(value).strip()
-                            
-                    processed_count += 1
-                    
-                    # Save progress every 5 companies
-                    if processed_count % 5 == 0:
-                        if output_file:
-                            df.to_csv(output_file, index=False)
-                        self.logger.info(f"Processed {processed_count}/{len(df)} companies")
-                        
-                except Exception as e:
-                    self.logger.error(f"Error processing {row.get('CompanyName', 'Unknown')}: {e}")
-                    continue
-                    
-            # Final save
+            # Workers get named tuples of the columns enrich_company reads; missing columns
+            # come through empty, and '.' becomes '_' so every column is an attribute
+            input_columns = ['CompanyName', 'CompanyNumber', 'SICCode.SicText_1', 'SICCode.SicText_2',
+                             'SICCode.SicText_3', 'SICCode.SicText_4']
+            records = list(
+                df.reindex(columns=input_columns, fill_value='')
+                .rename(columns=lambda col: col.replace('.', '_'))
+                .itertuples(index=False, name='Row')
+            )
+            
+            # Results are collected per column by row position and assigned to the dataframe whole
+            results = {col: df[col].tolist() for col in new_columns}
+            
             if not output_file:
                 output_file = input_file.replace('.csv', '_fully_enriched.csv')
                 
+            # Progress goes to the output file as appended batches of finished rows, after
+            # a header written once here
+            df.head(0).to_csv(output_file, index=False)
+            pending = []
+            
+            # Process companies on a thread pool; every call is waiting on the network,
+            # and only this thread touches the results
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # Always process (don't skip based on existing data)
+                futures = {executor.submit(self.enrich_company, record): position for position, record in enumerate(records)}
+                
+                for processed_count, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    position = futures[future]
+                    try:
+                        enriched_info = future.result()
+                        
+                        # Keep non-empty values
+                        for key, value in enriched_info.items():
+                            if value and str(value).strip():
+                                results[key][position] = str(value).strip()
+                        pending.append(position)
+                        
+                        # Save progress every 50 companies
+                        if processed_count % 50 == 0:
+                            self.append_rows(df, results, pending, output_file)
+                            self.logger.info(f"Processed {processed_count}/{len(df)} companies")
+                            
+                    except Exception as e:
+                        self.logger.error(f"Error processing {records[position].CompanyName}: {e}")
+                        continue
+                        
+            df[new_columns] = pd.DataFrame(results, index=df.index)
+            
+            # Final save, rewriting the file whole and in input order
             df.to_csv(output_file, index=False)
             self.logger.info(f"Processing complete! Results saved to {output_file}")
             
@@ -421,6 +730,16 @@ class CompanyEnrichmentAgent:
         except Exception as e:
             self.logger.error(f"Error processing file: {e}")
             return None
+            
+    @staticmethod
+    def append_rows(df: pd.DataFrame, results: Dict[str, list], pending: list, output_file: str):
+        """Append the pending rows, with their results, to the output file"""
+        if pending:
+            rows = df.iloc[pending].copy()
+            for col, values in results.items():
+                rows[col] = [values[position] for position in pending]
+            rows.to_csv(output_file, mode='a', header=False, index=False)
+            pending.clear()
 
 # Usage
 def main():
@@ -429,7 +748,10 @@ def main():
     input_file = "industrials_enriched.csv"
     output_file = "industrials_fully_enriched.csv"
     
-    enriched_df = agent.process_csv(input_file, output_file)
+    try:
+        enriched_df = agent.process_csv(input_file, output_file)
+    finally:
+        agent.close()
     
     if enriched_df is not None:
         print("\nSample of enriched data:")
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+hyperscan = pytest.importorskip('hyperscan')
+v3 = pytest.importorskip('original_company_enrichment_agent_v3')
+
+
+def test_hyperscan_database_is_built():
+    assert v3._EMP_DATABASE is not None
+
+
+def test_scan_start_stops_at_first_hit():
+    text = 'x' * 5000 + ' Average number of employees: 42 ' + 'y' * 100 + ' 7 employees'
+    start = v3._employee_scan_start(text)
+    assert start <= text.index('Average')
+    assert v3._EMP_UNION.search(text, start).start() == text.index('Average')
+
+
+def test_scan_start_without_hits_skips_text():
+    text = 'no counts on this page'
+    assert v3._employee_scan_start(text) == len(text)
+
+
+def test_hyperscan_and_regex_paths_agree(monkeypatch):
+    text = 'x' * 5000 + ' Average number of employees: 42 ' + 'y' * 100 + ' 7 employees'
+    assert v3._employee_count_from_text(text) == '42'
+    chunks = [text[i:i + 1000] for i in range(0, len(text), 1000)]
+    assert v3._employee_count_from_chunks(chunks) == '42'
+
+    monkeypatch.setattr(v3, '_EMP_DATABASE', None)
+    assert v3._employee_count_from_text(text) == '42'
+    assert v3._employee_count_from_chunks(chunks) == '42'